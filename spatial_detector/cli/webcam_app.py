@@ -1,9 +1,16 @@
 #!/usr/bin/env python3
 import argparse
+import contextlib
+import functools
+import platform
+import queue
 import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 import cv2
+import numpy as np
 import torch
 
 from spatial_detector.depth import MiDaSDepthEstimator
@@ -12,6 +19,255 @@ from spatial_detector.mapping import DepthCalibrator, SpatialMap
 from spatial_detector.projection import PinholeCamera
 from spatial_detector.visualization import Visualizer
 
+# Seconds between redraws of the spatial map window
+MAP_REFRESH_INTERVAL = 0.1
+
+# Webcam frames used to calibrate INT8 activation ranges
+INT8_CALIBRATION_FRAMES = 32
+
+# Seconds the "CALIBRATED!" confirmation stays on screen
+CALIBRATION_FEEDBACK_DURATION = 0.5
+
+
+def _put_latest(q, item):
+    """Put an item on a bounded queue, discarding the oldest entry if full"""
+    while True:
+        try:
+            q.put_nowait(item)
+            return
+        except queue.Full:
+            with contextlib.suppress(queue.Empty):
+                q.get_nowait()
+
+
+def _get_until_stopped(q, stop):
+    """Get the next item from a queue, or None once the pipeline is stopped"""
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            pass
+    return None
+
+
+def _gstreamer_pipeline(camera_index, width, height):
+    """
+    Build a GStreamer capture pipeline for the platform's camera source.
+
+    The appsink keeps at most two buffers and drops older ones, so frames
+    never queue up behind a slow consumer.
+    """
+    if platform.system() == "Darwin":
+        source = f"avfvideosrc device-index={camera_index}"
+    else:
+        source = f"v4l2src device=/dev/video{camera_index}"
+    return (
+        f"{source} ! video/x-raw,width={width},height={height} ! videoconvert ! "
+        "video/x-raw,format=BGR ! appsink drop=true max-buffers=2"
+    )
+
+
+def _open_camera(camera_index, width, height, use_gstreamer=False):
+    """Open the webcam, preferring a GStreamer pipeline when requested"""
+    if use_gstreamer:
+        cap = cv2.VideoCapture(
+            _gstreamer_pipeline(camera_index, width, height), cv2.CAP_GSTREAMER
+        )
+        if cap.isOpened():
+            print("Using GStreamer capture pipeline")
+            return cap
+        print("GStreamer pipeline unavailable, falling back to default capture")
+    return cv2.VideoCapture(camera_index)
+
+
+def _open_writer(path, fps, frame_size):
+    """
+    Open a video writer for recording, preferring a hardware H.264 encoder.
+
+    NVENC (Linux) or VideoToolbox (macOS) is tried through a GStreamer
+    pipeline first; if OpenCV lacks GStreamer support or the encoder is
+    missing, the CPU MPEG-4 encoder is used instead.
+    """
+    encoder = "vtenc_h264_hw" if platform.system() == "Darwin" else "nvh264enc"
+    # Quote the path for the pipeline parser so spaces or '!' in it do not
+    # split the pipeline; backslashes and quotes are escaped inside the string
+    quoted_path = path.replace("\\", "\\\\").replace('"', '\\"')
+    pipeline = (
+        f"appsrc ! videoconvert ! {encoder} ! h264parse ! mp4mux ! "
+        f'filesink location="{quoted_path}"'
+    )
+    out = cv2.VideoWriter(pipeline, cv2.CAP_GSTREAMER, 0, fps, frame_size)
+    if out.isOpened():
+        print(f"Recording with hardware encoder {encoder}")
+        return out
+    out.release()
+
+    fourcc = cv2.VideoWriter_fourcc(*"mp4v")
+    return cv2.VideoWriter(path, fourcc, fps, frame_size)
+
+
+class _MotionGate:
+    """
+    Flags frames that barely differ from the last frame detection ran on.
+
+    Frames are compared as 16x16 thumbnails by mean absolute difference,
+    which costs microseconds against a multi-millisecond YOLO call.
+    """
+
+    SIZE = 16
+
+    def __init__(self, threshold):
+        """
+        Args:
+            threshold: Mean absolute pixel difference (0-255) below which a
+                       frame counts as static; 0 disables the gate
+        """
+        self.threshold = threshold
+        self._reference = None
+
+    def is_static(self, frame):
+        """
+        Check a frame against the reference. Frames that are not static
+        become the new reference, since the caller will run detection on them.
+        """
+        if self.threshold <= 0:
+            return False
+        thumb = cv2.resize(
+            frame, (self.SIZE, self.SIZE), interpolation=cv2.INTER_AREA
+        ).astype(np.int16)
+        if (
+            self._reference is not None
+            and np.abs(thumb - self._reference).mean() < self.threshold
+        ):
+            return True
+        self._reference = thumb
+        return False
+
+
+def _depth_input(frame, depth_width):
+    """Downscale a frame to depth_width pixels wide for depth estimation"""
+    height, width = frame.shape[:2]
+    if not depth_width or depth_width >= width:
+        return frame
+    depth_height = max(1, round(height * depth_width / width))
+    return cv2.resize(frame, (depth_width, depth_height), interpolation=cv2.INTER_AREA)
+
+
+def _depth_at(depth_map, frame_shape, x, y):
+    """
+    Sample a depth map at frame pixel (x, y).
+
+    The depth map may have been estimated at a lower resolution than the
+    frame, so the coordinates are scaled onto it first.
+    """
+    depth_h, depth_w = depth_map.shape[:2]
+    frame_h, frame_w = frame_shape[:2]
+    if (depth_h, depth_w) != (frame_h, frame_w):
+        x = x * depth_w // frame_w
+        y = y * depth_h // frame_h
+    return MiDaSDepthEstimator.get_depth_at_point(depth_map, x, y)
+
+
+def _project_detections(detections, depth_map, frame_shape, camera, calibrator):
+    """
+    Project detection centers to 3D in one vectorized pass.
+
+    Args:
+        detections: List of detection dictionaries with 'center'
+        depth_map: Normalized depth map, possibly smaller than the frame
+        frame_shape: Shape of the frame the detections refer to
+        camera: PinholeCamera used for the projection
+        calibrator: DepthCalibrator converting normalized depth to meters
+
+    Returns:
+        List of (X, Y, Z) tuples, (0, 0, 0) where no valid depth was found
+    """
+    if not detections:
+        return []
+
+    centers = np.array([d["center"] for d in detections], dtype=np.int64)
+
+    # Sample depth at every center with one fancy-index, scaling frame
+    # coordinates onto the depth map
+    depth_h, depth_w = depth_map.shape[:2]
+    frame_h, frame_w = frame_shape[:2]
+    xs = centers[:, 0] * depth_w // frame_w
+    ys = centers[:, 1] * depth_h // frame_h
+    in_bounds = (xs >= 0) & (xs < depth_w) & (ys >= 0) & (ys < depth_h)
+    depths = np.full(len(detections), np.nan)
+    depths[in_bounds] = depth_map[ys[in_bounds], xs[in_bounds]]
+
+    # Convert to metric depth and project
+    metric_depths = calibrator.depth_to_meters(depths)
+    points = camera.pixels_to_3d(
+        centers[:, 0], centers[:, 1], metric_depths, normalized_depth=False
+    )
+
+    # NaN rows (no valid depth) fall back to the origin, which the spatial map
+    # skips
+    return [
+        tuple(point) if point[2] == point[2] else (0, 0, 0) for point in points.tolist()
+    ]
+
+
+class _TextSprite:
+    """
+    Text rasterized once and blitted onto frames, for labels that never change.
+    """
+
+    def __init__(self, text, font_scale, color, thickness):
+        font = cv2.FONT_HERSHEY_SIMPLEX
+        (text_w, text_h), baseline = cv2.getTextSize(text, font, font_scale, thickness)
+        self.ascent = text_h
+        self.width = text_w
+        # Pen position putText would continue from after this text.
+        # getTextSize's width adds the stroke thickness, so take the
+        # difference with and without a trailing glyph instead
+        self.advance = (
+            cv2.getTextSize(text + "0", font, font_scale, thickness)[0][0]
+            - cv2.getTextSize("0", font, font_scale, thickness)[0][0]
+        )
+        self.image = np.zeros((text_h + baseline + thickness, text_w, 3), np.uint8)
+        cv2.putText(self.image, text, (0, text_h), font, font_scale, color, thickness)
+        self.mask = self.image.any(axis=2)
+
+    def draw(self, frame, origin):
+        """Blit the text with its baseline-left corner at origin, like putText"""
+        x, y = origin[0], origin[1] - self.ascent
+        h, w = self.mask.shape
+        if x < 0 or y < 0 or y + h > frame.shape[0] or x + w > frame.shape[1]:
+            return
+        np.copyto(frame[y : y + h, x : x + w], self.image, where=self.mask[..., None])
+
+
+def _call_on_stream(stream, fn, *args):
+    """Call fn with stream as the current CUDA stream, if one is given"""
+    if stream is None:
+        return fn(*args)
+    # Order after work already queued by the caller, e.g. a shared upload
+    stream.wait_stream(torch.cuda.current_stream())
+    with torch.cuda.stream(stream):
+        return fn(*args)
+
+
+def _create_window(name):
+    """Create a display window, rendered through OpenGL when HighGUI supports it"""
+    try:
+        cv2.namedWindow(name, cv2.WINDOW_NORMAL | cv2.WINDOW_OPENGL)
+    except cv2.error:
+        # OpenCV built without OpenGL support
+        cv2.namedWindow(name, cv2.WINDOW_NORMAL)
+
+
+def _run_stage(loop, stop):
+    """Run a pipeline stage, stopping the whole pipeline if it fails"""
+    try:
+        loop()
+    except Exception as e:
+        print(f"Error in pipeline stage {loop.__name__}: {e}")
+    finally:
+        stop.set()
+
 
 def main():
     parser = argparse.ArgumentParser(
@@ -36,7 +292,76 @@ def main():
     parser.add_argument(
         "--room-depth", type=float, default=5.0, help="Room depth in meters"
     )
+    parser.add_argument(
+        "--batch",
+        type=int,
+        default=1,
+        help="Frames per inference batch; larger batches raise GPU throughput "
+        "at the cost of about batch/fps extra latency (default: 1)",
+    )
+    parser.add_argument(
+        "--engine",
+        action="store_true",
+        help="Run YOLO as a TensorRT FP16 engine (CUDA only) and compile MiDaS "
+        "with torch.compile",
+    )
+    parser.add_argument(
+        "--int8",
+        action="store_true",
+        help="Run YOLO as an INT8 ONNX model quantized on webcam frames "
+        "(CPU only, requires onnxruntime)",
+    )
+    parser.add_argument(
+        "--gstreamer",
+        action="store_true",
+        help="Capture through a GStreamer pipeline (requires OpenCV with GStreamer)",
+    )
+    parser.add_argument(
+        "--depth-width",
+        type=int,
+        default=0,
+        help="Run depth estimation on frames downscaled to this width; depth is "
+        "sampled at scaled coordinates (default: full frame width)",
+    )
+    parser.add_argument(
+        "--depth-interval",
+        type=int,
+        default=1,
+        help="Re-estimate depth every N frames (batches with --batch) and "
+        "reuse the last depth map in between (default: every frame)",
+    )
+    parser.add_argument(
+        "--gpu-preprocess",
+        action="store_true",
+        help="Resize and normalize depth input on the GPU instead of the CPU",
+    )
+    parser.add_argument(
+        "--motion-threshold",
+        type=float,
+        default=0.0,
+        help="Skip detection and reuse the last detections when the mean pixel "
+        "change since the last detected frame is below this (e.g. 2.0; "
+        "default: 0, always detect)",
+    )
+    parser.add_argument(
+        "--smooth-depth-range",
+        action="store_true",
+        help="Normalize depth by a running average of the scene's depth range "
+        "instead of per-frame min/max, reducing flicker",
+    )
+    parser.add_argument(
+        "--shared-input",
+        action="store_true",
+        help="Upload each frame to the GPU once and share it between YOLO and "
+        "MiDaS (CUDA only, implies --gpu-preprocess)",
+    )
+    parser.add_argument(
+        "--half",
+        action="store_true",
+        help="Run YOLO and MiDaS in FP16 on CUDA/MPS (ignored on CPU)",
+    )
     args = parser.parse_args()
+    batch_size = max(1, args.batch)
 
     # Detect best available device for Apple Silicon
     if args.device:
@@ -55,12 +380,29 @@ def main():
 
     # Initialize components
     detector = YOLODetector(
-        model_path=args.yolo_model, confidence=args.confidence, device=device
+        model_path=args.yolo_model,
+        confidence=args.confidence,
+        device=device,
+        half=args.half,
+    )
+    depth_estimator = MiDaSDepthEstimator(
+        device=device,
+        half=args.half,
+        gpu_preprocess=args.gpu_preprocess or args.shared_input,
+        smooth_range=args.smooth_depth_range,
     )
-    depth_estimator = MiDaSDepthEstimator(device=device)
     camera = PinholeCamera(image_size=(args.width, args.height))
     visualizer = Visualizer(show_depth=True, show_labels=True)
 
+    # Optimized inference backends; TensorRT is skipped off CUDA, where only
+    # the compiled MiDaS model applies
+    if args.engine:
+        detector.export_engine(half=True, batch=batch_size)
+        sample = _depth_input(
+            np.zeros((args.height, args.width, 3), np.uint8), args.depth_width
+        )
+        depth_estimator.compile_model(sample_shape=sample.shape)
+
     # Initialize new components
     depth_calibrator = DepthCalibrator(calibration_file=args.depth_calibration)
     spatial_map = SpatialMap(room_dimensions=(args.room_width, args.room_depth))
@@ -71,7 +413,7 @@ def main():
 
     # Open webcam
     print(f"Opening webcam at index {args.camera}...")
-    cap = cv2.VideoCapture(args.camera)
+    cap = _open_camera(args.camera, args.width, args.height, args.gstreamer)
     if not cap.isOpened():
         print(f"Error: Could not open webcam at index {args.camera}")
         return 1
@@ -79,6 +421,8 @@ def main():
     # Set webcam resolution
     cap.set(cv2.CAP_PROP_FRAME_WIDTH, args.width)
     cap.set(cv2.CAP_PROP_FRAME_HEIGHT, args.height)
+    # Keep only the newest frame in the driver so reads are never stale
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
 
     # Get actual webcam properties
     width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
@@ -86,26 +430,49 @@ def main():
     fps = cap.get(cv2.CAP_PROP_FPS)
     print(f"Webcam resolution: {width}x{height}, FPS: {fps}")
 
+    # Quantize on frames from this camera so the INT8 ranges fit the scene
+    if args.int8 and not str(device).startswith("cpu"):
+        print("INT8 quantization is only used on CPU, ignoring --int8")
+    elif args.int8:
+        calibration_frames = []
+        for _ in range(INT8_CALIBRATION_FRAMES):
+            ret, frame = cap.read()
+            if ret:
+                calibration_frames.append(frame)
+        detector.export_int8(calibration_frames)
+
     # Set up video writer if recording
     out = None
     if args.record:
-        fourcc = cv2.VideoWriter_fourcc(*"mp4v")
-        out = cv2.VideoWriter(args.record, fourcc, fps, (width * 2, height))
+        out = _open_writer(args.record, fps, (width * 2, height))
 
     # Create windows
     main_window = "3D Object Detection"
     map_window = "Spatial Map"
-    cv2.namedWindow(main_window, cv2.WINDOW_NORMAL)
-    cv2.namedWindow(map_window, cv2.WINDOW_NORMAL)
-
-    # FPS calculation variables
-    frame_count = 0
-    start_time = time.time()
-    fps_display = 0
-
-    # Calibration mode variables
-    calibration_mode = False
-    calibration_distance = 1.0  # Default distance in meters
+    _create_window(main_window)
+    _create_window(map_window)
+
+    # Calibration mode variables, toggled from the display loop and read by the
+    # render stage
+    state = {
+        "calibration_mode": False,
+        "calibration_distance": 1.0,
+        # Monotonic time until which render_frame shows the calibration
+        # confirmation
+        "calibrated_until": 0.0,
+    }
+
+    # Static part of the FPS overlay, rasterized once
+    fps_label = _TextSprite("FPS: ", 0.7, (0, 255, 0), 2)
+
+    # The top-down map changes slowly, so it is redrawn at most every
+    # MAP_REFRESH_INTERVAL seconds and reused in between
+    map_cache = {"viz": None, "updated": 0.0}
+
+    # Side-by-side recording canvas, allocated once
+    record_cache = {"canvas": None, "map": None}
+    if out:
+        record_cache["canvas"] = np.zeros((height, width * 2, 3), np.uint8)
 
     print("\nControls:")
     print("  'q': Quit")
@@ -117,49 +484,216 @@ def main():
     print("  'space': Set calibration point in calibration mode")
     print("  's': Save depth calibration")
 
-    # Process webcam feed
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            print("Error: Failed to capture image from webcam")
-            break
-
-        # Update FPS calculation
-        frame_count += 1
-        elapsed_time = time.time() - start_time
-        if elapsed_time >= 1.0:  # Update FPS every second
-            fps_display = frame_count / elapsed_time
-            frame_count = 0
-            start_time = time.time()
-
-        # Detect objects
-        detections = detector.detect(frame)
+    # Capture, inference and rendering run in their own threads so camera I/O,
+    # model inference and drawing overlap; the main thread only displays frames
+    # and handles keys (HighGUI must stay on the main thread). Each queue holds
+    # at most two items (or one batch) and drops the oldest, keeping latency
+    # bounded.
+    stop = threading.Event()
+    captured = queue.Queue(maxsize=max(2, batch_size))
+    inferred = queue.Queue(maxsize=max(2, batch_size))
+    rendered = queue.Queue(maxsize=2)
+
+    # Set by the inference stage while it waits for a frame. The capture
+    # thread grabs at camera rate but only decodes (retrieves) a frame when one
+    # is wanted, so frames that would be dropped are never converted.
+    frame_wanted = threading.Event()
+
+    # Frames are decoded into a ring of reused buffers instead of a fresh
+    # array per frame. The ring is larger than the number of frames the
+    # queues and stages can hold at once, so a buffer is never overwritten
+    # while still in use.
+    ring_size = captured.maxsize + batch_size + inferred.maxsize + rendered.maxsize + 3
+
+    def capture_loop():
+        ring = [None] * ring_size
+        slot = 0
+        while not stop.is_set() and cap.isOpened():
+            if not cap.grab():
+                print("Error: Failed to capture image from webcam")
+                break
+            if not frame_wanted.is_set():
+                continue
+            frame_wanted.clear()
+            ret, frame = cap.retrieve(ring[slot])
+            if not ret:
+                print("Error: Failed to capture image from webcam")
+                break
+            # retrieve() allocates on first use or if the frame size changes
+            ring[slot] = frame
+            slot = (slot + 1) % ring_size
+            _put_latest(captured, frame)
+
+    def next_frame():
+        frame_wanted.set()
+        return _get_until_stopped(captured, stop)
+
+    # YOLO and MiDaS share no data until projection. On CUDA they run
+    # concurrently on separate streams so each can use the SMs the other leaves
+    # idle at small batch sizes; elsewhere they run one after the other.
+    depth_pool = None
+    det_stream = depth_stream = None
+    if str(device).startswith("cuda"):
+        depth_pool = ThreadPoolExecutor(max_workers=1)
+        det_stream = torch.cuda.Stream()
+        depth_stream = torch.cuda.Stream()
+
+    def run_models(detect_fn, depth_fn, frame_arg, depth_arg):
+        if depth_pool is None:
+            return detect_fn(frame_arg), depth_fn(depth_arg)
+        depth_future = depth_pool.submit(
+            _call_on_stream, depth_stream, depth_fn, depth_arg
+        )
+        detections = _call_on_stream(det_stream, detect_fn, frame_arg)
+        # Both calls copy their results to the host, which synchronizes the
+        # stream they ran on
+        return detections, depth_future.result()
+
+    # With --shared-input each frame is uploaded once and both models
+    # preprocess the same device tensor
+    upload_frames = None
+    if args.shared_input:
+        if str(device).startswith("cuda") and depth_estimator.gpu_preprocessor:
+            upload_frames = depth_estimator.gpu_preprocessor.upload
+        else:
+            print("Shared GPU input requires CUDA, preprocessing per model")
+
+    def inference_loop():
+        depth_interval = max(1, args.depth_interval)
+        step = 0
+        last_depth_norm = None
+        motion_gate = _MotionGate(args.motion_threshold)
+        last_detections = []
+        detect, detect_batch = detector.detect, detector.detect_batch
+        estimate, estimate_batch = (
+            depth_estimator.estimate_depth,
+            depth_estimator.estimate_depth_batch,
+        )
 
-        # Estimate depth
-        raw_depth_map, depth_norm = depth_estimator.estimate_depth(frame)
+        while True:
+            frame = next_frame()
+            if frame is None:
+                return
+
+            # Depth changes slowly, so it only needs refreshing every few steps
+            run_depth = last_depth_norm is None or step % depth_interval == 0
+            step += 1
+
+            if batch_size == 1:
+                # Detect objects and estimate depth; a static scene keeps the
+                # last detections
+                static = motion_gate.is_static(frame)
+                if upload_frames is not None and (run_depth or not static):
+                    frame_tensor = upload_frames([frame])
+                    detect = functools.partial(
+                        detector.detect, frame_tensor=frame_tensor
+                    )
+                    estimate = functools.partial(
+                        depth_estimator.estimate_depth, frame_tensor=frame_tensor
+                    )
+
+                if run_depth and not static:
+                    detections, (_, last_depth_norm) = run_models(
+                        detect,
+                        estimate,
+                        frame,
+                        _depth_input(frame, args.depth_width),
+                    )
+                else:
+                    if run_depth:
+                        _, last_depth_norm = estimate(
+                            _depth_input(frame, args.depth_width)
+                        )
+                    detections = last_detections if static else detect(frame)
+                last_detections = detections
+
+                _put_latest(inferred, (frame, detections, last_depth_norm))
+                continue
+
+            # Gather a full batch so both models run once per batch
+            frames = [frame]
+            while len(frames) < batch_size:
+                frame = next_frame()
+                if frame is None:
+                    return
+                frames.append(frame)
+
+            # Every frame is checked so the gate's reference keeps up
+            static_frames = [motion_gate.is_static(frame) for frame in frames]
+            static = all(static_frames)
+            if upload_frames is not None and (run_depth or not static):
+                frame_tensor = upload_frames(frames)
+                detect_batch = functools.partial(
+                    detector.detect_batch, frame_tensor=frame_tensor
+                )
+                estimate_batch = functools.partial(
+                    depth_estimator.estimate_depth_batch, frame_tensor=frame_tensor
+                )
+            depth_inputs = None
+            if run_depth:
+                depth_inputs = [
+                    _depth_input(frame, args.depth_width) for frame in frames
+                ]
+            if run_depth and not static:
+                batch_detections, batch_depths = run_models(
+                    detect_batch,
+                    estimate_batch,
+                    frames,
+                    depth_inputs,
+                )
+            else:
+                if run_depth:
+                    batch_depths = estimate_batch(depth_inputs)
+                if static:
+                    batch_detections = [last_detections] * len(frames)
+                else:
+                    batch_detections = detect_batch(frames)
+            last_detections = batch_detections[-1]
+
+            if run_depth:
+                depth_norms = [depth_norm for _, depth_norm in batch_depths]
+                last_depth_norm = depth_norms[-1]
+            else:
+                depth_norms = [last_depth_norm] * len(frames)
+
+            # Hand results on in capture order
+            for frame, detections, depth_norm in zip(
+                frames, batch_detections, depth_norms
+            ):
+                _put_latest(inferred, (frame, detections, depth_norm))
+
+    def render_loop():
+        # FPS as an exponentially weighted moving average of frame intervals
+        ewma_dt = 0.0
+        prev_time = time.perf_counter()
+        fps_display = 0
+
+        while True:
+            item = _get_until_stopped(inferred, stop)
+            if item is None:
+                return
+            frame, detections, depth_norm = item
+
+            # Update FPS calculation
+            now = time.perf_counter()
+            dt, prev_time = now - prev_time, now
+            ewma_dt = dt if not ewma_dt else 0.9 * ewma_dt + 0.1 * dt
+            fps_display = 1.0 / ewma_dt if ewma_dt > 0 else 0
+
+            annotated_frame, map_viz = render_frame(
+                frame, detections, depth_norm, fps_display
+            )
+            _put_latest(rendered, (annotated_frame, map_viz, frame, depth_norm))
 
-        # Convert to metric depth using calibration
-        metric_depth_map = depth_calibrator.depth_to_meters(depth_norm)
+    def render_frame(frame, detections, depth_norm, fps_display):
+        """Project, visualize and record one inferred frame"""
+        calibration_mode = state["calibration_mode"]
+        calibration_distance = state["calibration_distance"]
 
         # Project to 3D
-        positions_3d = []
-        for detection in detections:
-            center_x, center_y = detection["center"]
-            # Get normalized depth
-            normalized_depth = depth_estimator.get_depth_at_point(
-                depth_norm, center_x, center_y
-            )
-            if normalized_depth is not None:
-                # Convert to metric depth
-                metric_depth = depth_calibrator.depth_to_meters(normalized_depth)
-                # Project to 3D
-                position_3d = camera.pixel_to_3d(
-                    center_x, center_y, metric_depth, normalized_depth=False
-                )
-                positions_3d.append(position_3d)
-            else:
-                # Use a fallback depth if point is invalid
-                positions_3d.append((0, 0, 0))
+        positions_3d = _project_detections(
+            detections, depth_norm, frame.shape, camera, depth_calibrator
+        )
 
         # Update spatial map
         spatial_map.update(detections, positions_3d)
@@ -214,9 +748,7 @@ def main():
             )
 
             # Get depth at calibration point
-            calibration_depth = depth_estimator.get_depth_at_point(
-                depth_norm, center_x, center_y
-            )
+            calibration_depth = _depth_at(depth_norm, frame.shape, center_x, center_y)
             if calibration_depth is not None:
                 current_estimate = depth_calibrator.depth_to_meters(calibration_depth)
                 cv2.putText(
@@ -230,29 +762,52 @@ def main():
                 )
 
             # Use depth visualization as background
+            metric_depth_map = depth_calibrator.depth_to_meters(depth_norm)
             depth_viz = depth_calibrator.visualize_depth(metric_depth_map, frame)
             annotated_frame = depth_viz
+
+            # Confirm a calibration from the display loop on the frames
+            # rendered right after it
+            if time.monotonic() < state["calibrated_until"]:
+                cv2.circle(annotated_frame, (center_x, center_y), 30, (0, 255, 0), 3)
+                cv2.putText(
+                    annotated_frame,
+                    "CALIBRATED!",
+                    (center_x - 70, center_y - 40),
+                    cv2.FONT_HERSHEY_SIMPLEX,
+                    0.8,
+                    (0, 255, 0),
+                    2,
+                )
         else:
-            # Regular object detection visualization
-            annotated_frame = visualizer.draw_detections(
-                frame, detections, positions_3d
-            )
+            # Regular object detection visualization; the frame is a ring
+            # buffer owned by the pipeline, so compose onto it directly. The
+            # depth overlay below uses the calibrator's metric colormap rather
+            # than the visualizer's thumbnail.
+            annotated_frame = visualizer.compose(frame, detections, positions_3d)
 
             # Add depth overlay if enabled
             if visualizer.show_depth:
-                depth_viz = depth_calibrator.visualize_depth(metric_depth_map)
-                # Place depth visualization in corner
+                # Shrink before converting and colorizing so those passes only
+                # touch the thumbnail rather than allocating full-frame maps
                 h, w = annotated_frame.shape[:2]
                 depth_h = int(h * 0.25)  # 25% of height
                 depth_w = int(w * 0.25)  # 25% of width
-                small_depth = cv2.resize(depth_viz, (depth_w, depth_h))
-                annotated_frame[0:depth_h, 0:depth_w] = small_depth
+                small_depth = cv2.resize(
+                    depth_norm, (depth_w, depth_h), interpolation=cv2.INTER_AREA
+                )
+                annotated_frame[0:depth_h, 0:depth_w] = (
+                    depth_calibrator.visualize_depth(
+                        depth_calibrator.depth_to_meters(small_depth)
+                    )
+                )
 
-        # Add FPS counter
+        # Add FPS counter; only the digits are rasterized per frame
+        fps_label.draw(annotated_frame, (width - 120, 30))
         cv2.putText(
             annotated_frame,
-            f"FPS: {fps_display:.1f}",
-            (width - 120, 30),
+            f"{fps_display:.1f}",
+            (width - 120 + fps_label.advance, 30),
             cv2.FONT_HERSHEY_SIMPLEX,
             0.7,
             (0, 255, 0),
@@ -260,33 +815,50 @@ def main():
         )
 
         # Generate map visualization
-        map_viz = spatial_map.get_topdown_view(width=400, height=400)
+        now = time.monotonic()
+        map_age = now - map_cache["updated"]
+        if map_cache["viz"] is None or map_age >= MAP_REFRESH_INTERVAL:
+            map_cache["viz"] = spatial_map.get_topdown_view(width=400, height=400)
+            map_cache["updated"] = now
+        map_viz = map_cache["viz"]
 
         # Create combined visualization for recording
         if out:
-            # Resize map to match frame height
-            map_viz_resized = cv2.resize(
-                map_viz, (height * map_viz.shape[1] // map_viz.shape[0], height)
-            )
-            # Create black padding if needed
-            padding = width - map_viz_resized.shape[1]
-            if padding > 0:
-                map_viz_resized = cv2.copyMakeBorder(
-                    map_viz_resized,
-                    0,
-                    0,
-                    0,
-                    padding,
-                    cv2.BORDER_CONSTANT,
-                    value=(0, 0, 0),
-                )
-            # Combine frame and map side by side
-            combined_frame = cv2.hconcat([annotated_frame, map_viz_resized])
-            out.write(combined_frame)
+            # Frame and map side by side in a reused canvas; the map half is
+            # only redrawn when the map itself changed
+            if map_viz is not record_cache["map"]:
+                # Resize map to match frame height, black padding to the right
+                map_w = min(width, height * map_viz.shape[1] // map_viz.shape[0])
+                map_area = record_cache["canvas"][:, width:]
+                map_area[:, :map_w] = cv2.resize(map_viz, (map_w, height))
+                map_area[:, map_w:] = 0
+                record_cache["map"] = map_viz
+            record_cache["canvas"][:, :width] = annotated_frame
+            out.write(record_cache["canvas"])
+
+        return annotated_frame, map_viz
+
+    workers = [
+        threading.Thread(target=_run_stage, args=(loop, stop), daemon=True)
+        for loop in (capture_loop, inference_loop, render_loop)
+    ]
+    for worker in workers:
+        worker.start()
+
+    # Display frames as they come out of the pipeline
+    shown_map = None
+    while True:
+        item = _get_until_stopped(rendered, stop)
+        if item is None:
+            break
+        annotated_frame, map_viz, frame, depth_norm = item
 
         # Display frames
         cv2.imshow(main_window, annotated_frame)
-        cv2.imshow(map_window, map_viz)
+        if map_viz is not shown_map:
+            # Only upload the map when render_frame produced a new one
+            cv2.imshow(map_window, map_viz)
+            shown_map = map_viz
 
         # Handle key presses
         key = cv2.waitKey(1) & 0xFF
@@ -300,40 +872,32 @@ def main():
             visualizer.show_labels = not visualizer.show_labels
             print(f"Labels: {'On' if visualizer.show_labels else 'Off'}")
         elif key == ord("c"):
-            calibration_mode = not calibration_mode
-            print(f"Calibration mode: {'On' if calibration_mode else 'Off'}")
+            state["calibration_mode"] = not state["calibration_mode"]
+            print(f"Calibration mode: {'On' if state['calibration_mode'] else 'Off'}")
         elif key == ord("+") or key == ord("="):
-            calibration_distance += 0.1
-            print(f"Calibration distance: {calibration_distance:.2f}m")
+            state["calibration_distance"] += 0.1
+            print(f"Calibration distance: {state['calibration_distance']:.2f}m")
         elif key == ord("-"):
-            calibration_distance = max(0.1, calibration_distance - 0.1)
-            print(f"Calibration distance: {calibration_distance:.2f}m")
-        elif (
-            key == ord(" ") or key == 32
-        ) and calibration_mode:  # Check for both space ordinal and 32 (ASCII for space)
+            state["calibration_distance"] = max(
+                0.1, state["calibration_distance"] - 0.1
+            )
+            print(f"Calibration distance: {state['calibration_distance']:.2f}m")
+        elif (key == ord(" ") or key == 32) and state[
+            "calibration_mode"
+        ]:  # Check for both space ordinal and 32 (ASCII for space)
             # Perform calibration at center point
             center_x, center_y = width // 2, height // 2
-            calibration_depth = depth_estimator.get_depth_at_point(
-                depth_norm, center_x, center_y
-            )
+            calibration_depth = _depth_at(depth_norm, frame.shape, center_x, center_y)
             if calibration_depth is not None:
                 depth_calibrator.calibrate_with_known_distance(
-                    calibration_depth, calibration_distance
+                    calibration_depth, state["calibration_distance"]
                 )
-                print(f"Calibrated depth at {calibration_distance:.2f}m")
-                # Give visual feedback for calibration
-                cv2.circle(frame, (center_x, center_y), 30, (0, 255, 0), 3)
-                cv2.putText(
-                    frame,
-                    "CALIBRATED!",
-                    (center_x - 70, center_y - 40),
-                    cv2.FONT_HERSHEY_SIMPLEX,
-                    0.8,
-                    (0, 255, 0),
-                    2,
+                print(f"Calibrated depth at {state['calibration_distance']:.2f}m")
+                # The render stage draws the confirmation; drawing here would
+                # land on a ring frame that was already annotated
+                state["calibrated_until"] = (
+                    time.monotonic() + CALIBRATION_FEEDBACK_DURATION
                 )
-                cv2.imshow(main_window, frame)
-                cv2.waitKey(500)  # Show feedback for 500ms
         elif key == ord("s"):
             # Save calibration
             if args.depth_calibration:
@@ -342,6 +906,11 @@ def main():
                 depth_calibrator.save_calibration("depth_calibration.json")
 
     # Clean up
+    stop.set()
+    for worker in workers:
+        worker.join(timeout=2.0)
+    if depth_pool is not None:
+        depth_pool.shutdown(wait=False)
     cap.release()
     if out:
         out.release()
@@ -0,0 +1,192 @@
+"""
+GPU preprocessing for MiDaS.
+Replaces the CPU MiDaS transforms (scale, resize, normalize, HWC->CHW), which
+run several full-frame float64 passes in numpy, with one upload of the raw
+uint8 frames followed by tensor ops on the device.
+"""
+
+import numpy as np
+import torch
+
+# Resize and normalization parameters of the MiDaS hub transforms
+MIDAS_PREPROCESS = {
+    "MiDaS_small": {
+        "target": 256,
+        "resize_method": "upper_bound",
+        "mean": (0.485, 0.456, 0.406),
+        "std": (0.229, 0.224, 0.225),
+    },
+    "DPT_Large": {
+        "target": 384,
+        "resize_method": "minimal",
+        "mean": (0.5, 0.5, 0.5),
+        "std": (0.5, 0.5, 0.5),
+    },
+    "DPT_Hybrid": {
+        "target": 384,
+        "resize_method": "minimal",
+        "mean": (0.5, 0.5, 0.5),
+        "std": (0.5, 0.5, 0.5),
+    },
+}
+
+
+def _constrain_to_multiple_of(x, min_val=0, max_val=None, multiple=32):
+    """Round x to a multiple exactly like MiDaS' Resize.constrain_to_multiple_of"""
+    y = int(np.round(x / multiple) * multiple)
+    if max_val is not None and y > max_val:
+        y = int(np.floor(x / multiple) * multiple)
+    if y < min_val:
+        y = int(np.ceil(x / multiple) * multiple)
+    return y
+
+
+def midas_input_size(height, width, target, resize_method):
+    """
+    Network input size the MiDaS transform would resize a frame to.
+
+    Mirrors Resize.get_size of the MiDaS hub transforms with
+    keep_aspect_ratio=True and ensure_multiple_of=32.
+
+    Args:
+        height, width: Frame size
+        target: Target side length of the transform
+        resize_method: "upper_bound" (fit inside target), "lower_bound"
+                       (cover target) or "minimal" (scale as little as
+                       possible)
+
+    Returns:
+        (height, width) tuple, both multiples of 32
+    """
+    scale_h = target / height
+    scale_w = target / width
+    if resize_method == "lower_bound":
+        scale = max(scale_h, scale_w)
+        return (
+            _constrain_to_multiple_of(scale * height, min_val=target),
+            _constrain_to_multiple_of(scale * width, min_val=target),
+        )
+    if resize_method == "upper_bound":
+        scale = min(scale_h, scale_w)
+        return (
+            _constrain_to_multiple_of(scale * height, max_val=target),
+            _constrain_to_multiple_of(scale * width, max_val=target),
+        )
+    if resize_method == "minimal":
+        # Keep the scale closest to 1
+        scale = scale_w if abs(1 - scale_w) < abs(1 - scale_h) else scale_h
+        return (
+            _constrain_to_multiple_of(scale * height),
+            _constrain_to_multiple_of(scale * width),
+        )
+    raise ValueError(f"Unknown resize method: {resize_method}")
+
+
+class GPUPreprocessor:
+    """
+    Uploads frames through reusable pinned buffers and prepares the MiDaS
+    input batch on the device.
+    """
+
+    # Pinned upload buffers used in turn, so filling one does not wait for
+    # the copy out of the other
+    NUM_HOST_BUFFERS = 2
+
+    def __init__(self, device, target, resize_method, mean, std):
+        """
+        Args:
+            device: Device the model runs on
+            target: Target side length of the MiDaS transform
+            resize_method: Resize method of the MiDaS transform
+            mean, std: Per-channel normalization statistics
+        """
+        self.device = torch.device(device)
+        self.target = target
+        self.resize_method = resize_method
+        self.mean = torch.tensor(mean, device=self.device).view(1, 3, 1, 1)
+        self.std = torch.tensor(std, device=self.device).view(1, 3, 1, 1)
+        self._host_buffers = [None] * self.NUM_HOST_BUFFERS
+        self._copy_events = [None] * self.NUM_HOST_BUFFERS
+        self._next_buffer = 0
+
+    @classmethod
+    def for_model(cls, model_type, device):
+        """Create a preprocessor matching a MiDaS model's hub transform"""
+        return cls(device, **MIDAS_PREPROCESS[model_type])
+
+    def upload(self, frames):
+        """
+        Copy same-sized uint8 frames to the device.
+
+        The result can be shared with other models that take device tensors
+        (see YOLODetector.detect), so the frames cross the bus only once.
+
+        Args:
+            frames: List of uint8 images (H, W, 3), all the same shape
+
+        Returns:
+            Float tensor of shape (N, 3, H, W) in 0-1, channels in the frames'
+            order
+        """
+        return self._upload(frames).permute(0, 3, 1, 2).float().div_(255.0)
+
+    def _upload(self, frames):
+        """Copy same-sized uint8 frames to the device as one NHWC tensor"""
+        shape = (len(frames), *frames[0].shape)
+        if self.device.type != "cuda":
+            return torch.from_numpy(np.stack(frames)).to(self.device)
+
+        # Pinned memory lets the copy run as DMA without a staging copy. The
+        # copy is asynchronous, so a buffer is only refilled once the event
+        # recorded after its last copy has fired
+        index = self._next_buffer
+        self._next_buffer = (index + 1) % self.NUM_HOST_BUFFERS
+        if self._copy_events[index] is not None:
+            self._copy_events[index].synchronize()
+
+        buffer = self._host_buffers[index]
+        if buffer is None or tuple(buffer.shape) != shape:
+            buffer = torch.empty(shape, dtype=torch.uint8).pin_memory()
+            self._host_buffers[index] = buffer
+        host = buffer.numpy()
+        for i, frame in enumerate(frames):
+            host[i] = frame
+
+        batch = buffer.to(self.device, non_blocking=True)
+        copied = torch.cuda.Event()
+        copied.record()
+        self._copy_events[index] = copied
+        return batch
+
+    def prepare(self, batch):
+        """
+        Resize and normalize an uploaded batch for MiDaS.
+
+        Args:
+            batch: Float tensor (N, 3, H, W) in 0-1 as returned by upload();
+                   it is not modified
+
+        Returns:
+            Normalized float tensor of shape (N, 3, h, w) on the device
+        """
+        size = midas_input_size(
+            batch.shape[2], batch.shape[3], self.target, self.resize_method
+        )
+        # interpolate writes a new tensor, so normalizing in place leaves the
+        # caller's batch untouched
+        batch = torch.nn.functional.interpolate(
+            batch, size=size, mode="bicubic", align_corners=False
+        )
+        return batch.sub_(self.mean).div_(self.std)
+
+    def __call__(self, frames):
+        """
+        Prepare a batch of frames for MiDaS.
+
+        Args:
+            frames: List of uint8 images (H, W, 3), all the same shape
+
+        Returns:
+            Normalized float tensor of shape (N, 3, h, w) on the device
+        """
+        return self.prepare(self.upload(frames))
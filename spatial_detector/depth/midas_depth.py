@@ -1,7 +1,12 @@
+import contextlib
+import warnings
+
 import cv2
 import numpy as np
 import torch
 
+from .gpu_preprocess import GPUPreprocessor
+
 # Model cache for improved performance
 _DEPTH_MODEL_CACHE = {}
 _TRANSFORM_CACHE = {}
@@ -26,6 +31,24 @@ def _get_cached_midas_model(model_type, device):
     return model
 
 
+def _fp16_autocast_supported(device_type):
+    """
+    Check whether this torch build can autocast to FP16 on a device type.
+
+    Older builds reject unknown device types (e.g. "mps" before torch 2.x)
+    with an error, others only warn and disable autocast, so warnings count as
+    unsupported too.
+    """
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            with torch.autocast(device_type=device_type, dtype=torch.float16):
+                pass
+        return True
+    except Exception:
+        return False
+
+
 # Cache the transforms for improved loading performance
 def _get_midas_transforms():
     """Get MiDaS transforms from cache or load new ones"""
@@ -40,7 +63,18 @@ class MiDaSDepthEstimator:
     Optimized with model caching for better performance.
     """
 
-    def __init__(self, model_type="MiDaS_small", device=None, progress_callback=None):
+    # Weight of the newest frame in the smoothed depth range
+    RANGE_EWMA_ALPHA = 0.1
+
+    def __init__(
+        self,
+        model_type="MiDaS_small",
+        device=None,
+        progress_callback=None,
+        half=False,
+        gpu_preprocess=False,
+        smooth_range=False,
+    ):
         """
         Initialize the MiDaS depth estimator.
 
@@ -48,12 +82,25 @@ class MiDaSDepthEstimator:
             model_type: MiDaS model type ("MiDaS_small", "DPT_Large", or "DPT_Hybrid")
             device: Computation device ('cuda', 'cpu', or None for auto-detection)
             progress_callback: Optional callback function to report loading progress
+            half: Run the forward pass under FP16 autocast (ignored on CPU)
+            gpu_preprocess: Resize and normalize frames on the device instead
+                            of with the CPU transforms (ignored on CPU)
+            smooth_range: Normalize depth by a running average of the depth
+                          range instead of each frame's own min/max, which
+                          stops the normalized map from flickering
         """
         self.model_type = model_type
         self.progress_callback = progress_callback
         self.model = None
         self.transform = None
         self.midas_transforms = None
+        self.gpu_preprocessor = None
+
+        # Pinned host buffer the depth maps are copied into on CUDA
+        self._host_buffer = None
+
+        self.smooth_range = smooth_range
+        self._depth_range = None  # Smoothed (min, max) of recent frames
 
         # Auto-detect the best available device
         if device is None:
@@ -66,6 +113,16 @@ class MiDaSDepthEstimator:
         else:
             self.device = device
 
+        # FP16 is slower than FP32 on CPU, so only use it on GPU devices
+        self.half = half and not str(self.device).startswith("cpu")
+        self._autocast_device_type = str(self.device).split(":")[0]
+        if self.half and not _fp16_autocast_supported(self._autocast_device_type):
+            print(
+                f"FP16 autocast is not supported on {self._autocast_device_type} "
+                "by this PyTorch build, running MiDaS in FP32"
+            )
+            self.half = False
+
         # Load MiDaS model with error handling and caching
         try:
             self._report_progress("Initializing MiDaS depth estimator...")
@@ -101,6 +158,11 @@ class MiDaSDepthEstimator:
                 else:
                     self.transform = self.midas_transforms.small_transform
                 print("Successfully loaded MiDaS transformations")
+
+                if gpu_preprocess and not str(self.device).startswith("cpu"):
+                    self.gpu_preprocessor = GPUPreprocessor.for_model(
+                        model_type, self.device
+                    )
             except Exception as transform_err:
                 error_msg = f"Error loading MiDaS transformations: {transform_err}"
                 print(error_msg)
@@ -120,16 +182,144 @@ class MiDaSDepthEstimator:
         if self.progress_callback:
             self.progress_callback("depth", message)
 
-    def estimate_depth(self, frame):
+    def _autocast(self):
+        """
+        Context for the forward pass: FP16 autocast when half precision is
+        enabled. The cached FP32 weights are left untouched and precision
+        sensitive ops such as normalization stay in FP32.
+        """
+        if not self.half:
+            return contextlib.nullcontext()
+        return torch.autocast(
+            device_type=self._autocast_device_type, dtype=torch.float16
+        )
+
+    def _prepare_input(self, frames, frame_tensor=None):
+        """Build the (N, C, H, W) model input batch on the device"""
+        if self.gpu_preprocessor is not None:
+            if frame_tensor is not None:
+                return self.gpu_preprocessor.prepare(frame_tensor)
+            return self.gpu_preprocessor(frames)
+        # Each transform yields a (1, C, H, W) tensor; stack into one batch
+        return torch.cat([self.transform(frame) for frame in frames]).to(self.device)
+
+    def _to_host(self, prediction):
+        """
+        Copy a depth prediction to host memory.
+
+        On CUDA the copy lands in a pinned buffer, which skips the driver's
+        pageable staging copy. The call still blocks until the copy is done,
+        but it waits on an event rather than the whole device, so kernels
+        queued on other streams (e.g. YOLO) keep running. The returned array
+        is a view of that buffer and is overwritten by the next call.
+        """
+        if not str(self.device).startswith("cuda"):
+            return prediction.cpu().numpy()
+
+        host = self._host_buffer
+        if host is None or host.shape != prediction.shape:
+            host = torch.empty(prediction.shape, dtype=torch.float32).pin_memory()
+            self._host_buffer = host
+
+        host.copy_(prediction, non_blocking=True)
+        copied = torch.cuda.Event()
+        copied.record()
+        copied.synchronize()
+        return host.numpy()
+
+    def _update_depth_range(self, prediction):
+        """
+        Fold the min/max of each predicted frame into the smoothed range.
+
+        The min/max come from a single aminmax reduction on the model's
+        device, so the full maps are not scanned again on the host.
+
+        Args:
+            prediction: Depth tensor of shape (H, W) or (N, H, W)
+
+        Returns:
+            List with the smoothed (min, max) to normalize each frame with
+        """
+        height, width = prediction.shape[-2:]
+        lows, highs = torch.aminmax(prediction.reshape(-1, height * width), dim=1)
+
+        alpha = self.RANGE_EWMA_ALPHA
+        ranges = []
+        for low, high in zip(lows.tolist(), highs.tolist()):
+            if self._depth_range is None:
+                self._depth_range = (low, high)
+            else:
+                prev_low, prev_high = self._depth_range
+                self._depth_range = (
+                    (1 - alpha) * prev_low + alpha * low,
+                    (1 - alpha) * prev_high + alpha * high,
+                )
+            ranges.append(self._depth_range)
+        return ranges
+
+    @staticmethod
+    def _normalize_with_range(depth_map, depth_range):
+        """Map depth_map to 0-1 with a given (min, max), clipping outliers"""
+        low, high = depth_range
+        depth_norm = np.subtract(depth_map, low, dtype=np.float32)
+        depth_norm *= 1.0 / (high - low) if high > low else 0.0
+        return np.clip(depth_norm, 0.0, 1.0, out=depth_norm)
+
+    def compile_model(self, sample_shape=(480, 640, 3)):
+        """
+        Compile the model with torch.compile for faster inference.
+
+        A warm-up pass is run so compilation errors surface here rather than
+        on the first frame; on failure the eager model is kept.
+
+        Args:
+            sample_shape: Frame shape used for the warm-up pass
+
+        Returns:
+            True if the compiled model is now in use, False otherwise
+        """
+        if self.model is None or self.transform is None:
+            return False
+        if not hasattr(torch, "compile"):
+            print("torch.compile requires PyTorch 2.0+, keeping eager MiDaS model")
+            return False
+
+        eager_model = self.model
+        try:
+            self._report_progress("Compiling MiDaS model...")
+            compiled = torch.compile(eager_model, mode="reduce-overhead")
+            sample = np.zeros(sample_shape, dtype=np.uint8)
+            with torch.no_grad(), self._autocast():
+                compiled(self._prepare_input([sample]))
+            self.model = compiled
+            print("Using compiled MiDaS model")
+            self._report_progress("MiDaS model compiled")
+            return True
+        except Exception as e:
+            print(f"Error compiling MiDaS model, keeping eager model: {e}")
+            self._report_progress(f"MiDaS compile error: {e}")
+            self.model = eager_model
+            return False
+
+    def estimate_depth(self, frame, normalize=True, frame_tensor=None):
         """
         Estimate depth from RGB image.
 
         Args:
             frame: RGB image as numpy array
+            normalize: Whether to also build the normalized depth map; callers
+                       that only sample a few points can skip this full-frame pass
+            frame_tensor: Optional copy of the frame already on the device, as
+                          returned by gpu_preprocessor.upload(). It may have a
+                          higher resolution than frame; the depth map still
+                          matches frame's size. Used only with gpu_preprocess.
 
         Returns:
-            depth_map: Raw depth map as numpy array
-            depth_normalized: Normalized depth map (0-1) for visualization
+            depth_map: Raw depth map as numpy array. On CUDA this is a view of
+                       a pinned buffer that the next call overwrites; copy
+                       it if it must live longer
+            depth_normalized: Normalized depth map (0-1) for visualization, or
+                              None if normalize is False
         """
         if self.model is None or self.transform is None:
             print("Error: MiDaS model not fully initialized")
@@ -140,24 +330,36 @@ class MiDaSDepthEstimator:
 
         try:
             # Transform input for MiDaS
-            input_batch = self.transform(frame).to(self.device)
+            input_batch = self._prepare_input([frame], frame_tensor)
 
             # Run inference
             with torch.no_grad():
-                prediction = self.model(input_batch)
+                with self._autocast():
+                    prediction = self.model(input_batch)
 
                 # Resize to original resolution
                 prediction = torch.nn.functional.interpolate(
-                    prediction.unsqueeze(1),
+                    prediction.float().unsqueeze(1),
                     size=frame.shape[:2],
                     mode="bicubic",
                     align_corners=False,
                 ).squeeze()
 
-            depth_map = prediction.cpu().numpy()
+                depth_ranges = None
+                if normalize and self.smooth_range:
+                    depth_ranges = self._update_depth_range(prediction)
+
+            depth_map = self._to_host(prediction)
+            if not normalize:
+                return depth_map, None
 
             # Normalize depth map for visualization
-            depth_norm = cv2.normalize(depth_map, None, 0, 1, norm_type=cv2.NORM_MINMAX)
+            if depth_ranges is not None:
+                depth_norm = self._normalize_with_range(depth_map, depth_ranges[0])
+            else:
+                depth_norm = cv2.normalize(
+                    depth_map, None, 0, 1, norm_type=cv2.NORM_MINMAX
+                )
 
             return depth_map, depth_norm
 
@@ -169,7 +371,68 @@ class MiDaSDepthEstimator:
             dummy_depth = np.zeros((h, w), dtype=np.float32)
             return dummy_depth, dummy_depth
 
-    def get_depth_at_point(self, depth_map, x, y):
+    def estimate_depth_batch(self, frames, normalize=True, frame_tensor=None):
+        """
+        Estimate depth for several same-sized frames in one forward pass.
+
+        Args:
+            frames: List of RGB images as numpy arrays, all the same shape
+            normalize: Whether to also build the normalized depth maps
+            frame_tensor: Optional batch of the frames already on the device,
+                          as for estimate_depth()
+
+        Returns:
+            List of (depth_map, depth_normalized) tuples, one per frame, as
+            returned by estimate_depth()
+        """
+        if self.model is None or self.transform is None:
+            print("Error: MiDaS model not fully initialized")
+            return [self.estimate_depth(frame, normalize) for frame in frames]
+
+        try:
+            input_batch = self._prepare_input(frames, frame_tensor)
+
+            # Run inference
+            with torch.no_grad():
+                with self._autocast():
+                    prediction = self.model(input_batch)
+
+                # Resize to original resolution
+                prediction = torch.nn.functional.interpolate(
+                    prediction.float().unsqueeze(1),
+                    size=frames[0].shape[:2],
+                    mode="bicubic",
+                    align_corners=False,
+                ).squeeze(1)
+
+                depth_ranges = [None] * len(frames)
+                if normalize and self.smooth_range:
+                    depth_ranges = self._update_depth_range(prediction)
+
+            depth_maps = self._to_host(prediction)
+
+            results = []
+            for depth_map, depth_range in zip(depth_maps, depth_ranges):
+                depth_norm = None
+                if depth_range is not None:
+                    depth_norm = self._normalize_with_range(depth_map, depth_range)
+                elif normalize:
+                    depth_norm = cv2.normalize(
+                        depth_map, None, 0, 1, norm_type=cv2.NORM_MINMAX
+                    )
+                results.append((depth_map, depth_norm))
+            return results
+
+        except Exception as e:
+            print(f"Error during batch depth estimation: {e}")
+            self._report_progress(f"Depth estimation error: {e}")
+            # Return dummy depth maps of correct shape
+            h, w = frames[0].shape[:2]
+            dummy_depth = np.zeros((h, w), dtype=np.float32)
+            return [(dummy_depth, dummy_depth) for _ in frames]
+
+    @staticmethod
+    def get_depth_at_point(depth_map, x, y):
         """
         Get depth value at specific point.
 
@@ -1,8 +1,22 @@
+import os
 from functools import lru_cache
 
+import cv2
+import numpy as np
 import torch
+import ultralytics
 from ultralytics import YOLO
 
+try:
+    from ultralytics.utils.ops import non_max_suppression
+except ImportError:
+    non_max_suppression = None
+
+# Ultralytics releases (major, minor) whose predictor internals the
+# shared-input path in YOLODetector._detect_tensor was checked against; other
+# releases use the public predictor call instead
+DIRECT_NMS_VERSIONS = ((8, 1), (8, 4))
+
 # Global model cache to avoid reloading the same model multiple times
 _MODEL_CACHE = {}
 
@@ -26,6 +40,88 @@ def _load_yolo_model(model_path, device=None):
     return model
 
 
+def _supports_direct_nms(version=ultralytics.__version__):
+    """Whether _detect_tensor may call the predictor's backend and NMS itself"""
+    if non_max_suppression is None:
+        return False
+    try:
+        release = tuple(int(part) for part in version.split(".")[:2])
+    except ValueError:
+        return False
+    low, high = DIRECT_NMS_VERSIONS
+    return low <= release < high
+
+
+def _letterbox_tensor(batch, imgsz=640, stride=32):
+    """
+    Letterbox a device batch the way Ultralytics does for numpy frames.
+
+    Args:
+        batch: Float tensor (N, 3, H, W) in 0-1
+        imgsz: Size the longer side is scaled to
+        stride: Model stride the padded size must be a multiple of
+
+    Returns:
+        letterboxed: Resized and padded batch
+        scale: Factor the frame was resized by
+        pad: (left, top) padding in pixels
+    """
+    height, width = batch.shape[2:]
+    scale = min(imgsz / height, imgsz / width)
+    new_h, new_w = round(height * scale), round(width * scale)
+    if (new_h, new_w) != (height, width):
+        batch = torch.nn.functional.interpolate(
+            batch, size=(new_h, new_w), mode="bilinear", align_corners=False
+        )
+
+    # Pad to the stride with Ultralytics' gray, split evenly on both sides
+    pad_h, pad_w = -new_h % stride, -new_w % stride
+    top, left = pad_h // 2, pad_w // 2
+    if pad_h or pad_w:
+        batch = torch.nn.functional.pad(
+            batch, (left, pad_w - left, top, pad_h - top), value=114 / 255
+        )
+    return batch, scale, (left, top)
+
+
+class _FrameCalibrationReader:
+    """
+    Feeds calibration frames to ONNX Runtime's static quantizer.
+
+    Frames are letterboxed to the exported model's square input the same way
+    Ultralytics preprocesses them at inference time.
+    """
+
+    def __init__(self, frames, input_name, imgsz):
+        self._inputs = [
+            {input_name: self._preprocess(frame, imgsz)} for frame in frames
+        ]
+        self._index = 0
+
+    @staticmethod
+    def _preprocess(frame, imgsz):
+        height, width = frame.shape[:2]
+        scale = min(imgsz / height, imgsz / width)
+        new_w, new_h = round(width * scale), round(height * scale)
+        canvas = np.full((imgsz, imgsz, 3), 114, np.uint8)
+        top, left = (imgsz - new_h) // 2, (imgsz - new_w) // 2
+        canvas[top : top + new_h, left : left + new_w] = cv2.resize(
+            frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR
+        )
+        # BGR HWC uint8 -> RGB NCHW float in [0, 1]
+        blob = canvas[:, :, ::-1].transpose(2, 0, 1)[np.newaxis]
+        return np.ascontiguousarray(blob, dtype=np.float32) / 255.0
+
+    def get_next(self):
+        if self._index >= len(self._inputs):
+            return None
+        self._index += 1
+        return self._inputs[self._index - 1]
+
+    def rewind(self):
+        self._index = 0
+
+
 class YOLODetector:
     """
     YOLO-based object detector for 2D object detection.
@@ -38,6 +134,7 @@ class YOLODetector:
         confidence=0.25,
         device=None,
         progress_callback=None,
+        half=False,
     ):
         """
         Initialize the YOLO detector.
@@ -47,6 +144,7 @@ class YOLODetector:
             confidence: Confidence threshold for detections
             device: Computation device ('cuda', 'mps', 'cpu', or None for auto-detection)
             progress_callback: Optional callback function to report loading progress
+            half: Run inference in FP16 (ignored on CPU)
         """
         self.confidence = confidence
         self.model = None
@@ -64,6 +162,9 @@ class YOLODetector:
         else:
             self.device = device
 
+        # FP16 is slower than FP32 on CPU, so only use it on GPU devices
+        self.half = half and not str(self.device).startswith("cpu")
+
         # Load YOLO model with error handling and caching
         try:
             self._report_progress("Initializing YOLO detector...")
@@ -98,12 +199,174 @@ class YOLODetector:
         if self.progress_callback:
             self.progress_callback("detector", message)
 
-    def detect(self, frame):
+    def export_engine(self, half=True, batch=1):
+        """
+        Swap the model for a TensorRT engine, exporting it on first use.
+
+        The engine is written next to the model weights, named after the batch
+        size and precision it was built for, and reused on later runs with the
+        same settings. Only available on CUDA devices.
+
+        Args:
+            half: Build an FP16 engine
+            batch: Maximum batch size the engine accepts
+
+        Returns:
+            True if the TensorRT engine is now in use, False otherwise
+        """
+        if self.model is None or not str(self.device).startswith("cuda"):
+            print("TensorRT export requires a CUDA device, keeping PyTorch model")
+            return False
+
+        try:
+            # An engine only accepts the batch size and precision it was built
+            # with, so both are part of the cached file name
+            precision = "fp16" if half else "fp32"
+            engine_path = (
+                f"{os.path.splitext(self.model_path)[0]}_b{batch}_{precision}.engine"
+            )
+            if not os.path.exists(engine_path):
+                self._report_progress("Exporting YOLO model to TensorRT...")
+                exported_path = self.model.export(
+                    format="engine",
+                    half=half,
+                    simplify=True,
+                    dynamic=True,
+                    batch=batch,
+                    device=self.device,
+                )
+                os.replace(exported_path, engine_path)
+            self.model = YOLO(engine_path, task="detect")
+            print(f"Using TensorRT engine: {engine_path}")
+            self._report_progress("TensorRT engine loaded")
+            return True
+        except Exception as e:
+            print(f"Error exporting YOLO model to TensorRT: {e}")
+            self._report_progress(f"TensorRT export error: {e}")
+            return False
+
+    def export_int8(self, calibration_frames, imgsz=640):
+        """
+        Swap the model for an INT8 ONNX model, quantizing it on first use.
+
+        Uses ONNX Runtime static post-training quantization (QDQ, per-channel
+        weights) calibrated on the given frames. The model is exported with a
+        dynamic batch dimension, so it serves detect() and detect_batch()
+        alike. It is written next to the model weights, named after its input
+        size, and reused on later runs. Only used on CPU, where integer
+        kernels are faster than FP32.
+
+        Args:
+            calibration_frames: List of BGR frames representative of the scene
+            imgsz: Square input size the model is exported at
+
+        Returns:
+            True if the INT8 model is now in use, False otherwise
+        """
+        if self.model is None or not str(self.device).startswith("cpu"):
+            print("INT8 quantization is only used on CPU, keeping PyTorch model")
+            return False
+
+        try:
+            import onnxruntime as ort
+            from onnxruntime.quantization import QuantFormat, QuantType, quantize_static
+        except ImportError:
+            print("onnxruntime is required for INT8 quantization")
+            return False
+
+        try:
+            int8_path = f"{os.path.splitext(self.model_path)[0]}_int8_{imgsz}.onnx"
+            if not os.path.exists(int8_path):
+                if not calibration_frames:
+                    print("No calibration frames for INT8 quantization")
+                    return False
+                self._report_progress("Quantizing YOLO model to INT8...")
+                onnx_path = self.model.export(
+                    format="onnx",
+                    imgsz=imgsz,
+                    dynamic=True,
+                    simplify=True,
+                    device="cpu",
+                )
+                session = ort.InferenceSession(
+                    onnx_path, providers=["CPUExecutionProvider"]
+                )
+                reader = _FrameCalibrationReader(
+                    calibration_frames, session.get_inputs()[0].name, imgsz
+                )
+                quantize_static(
+                    onnx_path,
+                    int8_path,
+                    reader,
+                    quant_format=QuantFormat.QDQ,
+                    per_channel=True,
+                    activation_type=QuantType.QInt8,
+                    weight_type=QuantType.QInt8,
+                )
+            self.model = YOLO(int8_path, task="detect")
+            print(f"Using INT8 ONNX model: {int8_path}")
+            self._report_progress("INT8 model loaded")
+            return True
+        except Exception as e:
+            print(f"Error quantizing YOLO model to INT8: {e}")
+            self._report_progress(f"INT8 quantization error: {e}")
+            return False
+
+    def _detect_tensor(self, frame_tensor, frame_shape):
+        """
+        Run the model on frames already on the device.
+
+        The predictor's postprocessing copies every input image to the host
+        to build its Results, which would undo the shared upload. So after the
+        first call has set the predictor up, the backend and NMS are called
+        directly with the predictor's own settings and only the boxes leave
+        the device. That relies on predictor internals, so on Ultralytics
+        releases outside DIRECT_NMS_VERSIONS every call goes through the
+        predictor.
+        """
+        # Ultralytics expects RGB tensors, while frames (and uploads of them)
+        # are BGR; it swaps channels itself only for numpy input
+        letterboxed, scale, pad = _letterbox_tensor(frame_tensor.flip(1))
+
+        predictor = getattr(self.model, "predictor", None)
+        if predictor is None or not _supports_direct_nms():
+            results = self.model(letterboxed, conf=self.confidence, half=self.half)
+            return [
+                self._result_to_detections(result, scale, pad, frame_shape)
+                for result in results
+            ]
+
+        backend = predictor.model
+        args = predictor.args
+        batch = letterboxed.half() if backend.fp16 else letterboxed
+        with torch.no_grad():
+            preds = backend(batch)
+        boxes = non_max_suppression(
+            preds,
+            conf_thres=self.confidence,
+            iou_thres=args.iou,
+            classes=args.classes,
+            agnostic=args.agnostic_nms,
+            max_det=args.max_det,
+        )
+        return [
+            self._boxes_to_detections(
+                image_boxes.cpu().numpy(), scale, pad, frame_shape
+            )
+            for image_boxes in boxes
+        ]
+
+    def detect(self, frame, frame_tensor=None):
         """
         Detect objects in a frame.
 
         Args:
             frame: RGB image as numpy array
+            frame_tensor: Optional copy of the frame already on the device, as
+                          a float (1, 3, H, W) tensor in 0-1 with the frame's
+                          channel order. It is letterboxed on the device and
+                          shared with other models instead of re-uploading
+                          the frame.
 
         Returns:
             List of dictionaries with detection information
@@ -114,37 +377,106 @@ class YOLODetector:
             return []
 
         try:
-            results = self.model(frame, conf=self.confidence)
+            if frame_tensor is not None:
+                return self._detect_tensor(frame_tensor, frame.shape)[0]
+
+            results = self.model(frame, conf=self.confidence, half=self.half)
 
             detections = []
             for result in results:
-                boxes = result.boxes
-                for _, box in enumerate(boxes):
-                    # Get bounding box
-                    x1, y1, x2, y2 = box.xyxy[0].cpu().numpy().astype(int)
-
-                    # Get class and confidence
-                    conf = float(box.conf[0].cpu().numpy())
-                    cls_id = int(box.cls[0].cpu().numpy())
-                    cls_name = self.model.names[cls_id]
-
-                    # Calculate center point
-                    center_x = (x1 + x2) // 2
-                    center_y = (y1 + y2) // 2
-
-                    detection = {
-                        "bbox": (x1, y1, x2, y2),
-                        "center": (center_x, center_y),
-                        "class_id": cls_id,
-                        "class_name": cls_name,
-                        "confidence": conf,
-                    }
-
-                    detections.append(detection)
-
+                detections.extend(self._result_to_detections(result))
             return detections
 
         except Exception as e:
             print(f"Error during detection: {e}")
             self._report_progress(f"Detection error: {e}")
             return []
+
+    def detect_batch(self, frames, frame_tensor=None):
+        """
+        Detect objects in several frames with a single batched model call.
+
+        Args:
+            frames: List of RGB images as numpy arrays
+            frame_tensor: Optional (N, 3, H, W) batch of the frames already on
+                          the device, as for detect()
+
+        Returns:
+            List with one list of detection dictionaries per frame, in order
+        """
+        if self.model is None:
+            print("Error: YOLO model not loaded")
+            return [[] for _ in frames]
+
+        try:
+            if frame_tensor is not None:
+                return self._detect_tensor(frame_tensor, frames[0].shape)
+
+            results = self.model(list(frames), conf=self.confidence, half=self.half)
+            return [self._result_to_detections(result) for result in results]
+
+        except Exception as e:
+            print(f"Error during batch detection: {e}")
+            self._report_progress(f"Detection error: {e}")
+            return [[] for _ in frames]
+
+    def _result_to_detections(self, result, scale=1.0, pad=(0, 0), frame_shape=None):
+        """
+        Convert one YOLO result into detection dictionaries.
+
+        Args:
+            result: Ultralytics result for one image
+            scale, pad: Letterbox applied to the model input, undone on the
+                        boxes so they are in frame pixels
+            frame_shape: Shape of the original frame, to clip boxes to
+        """
+        boxes = result.boxes
+        if len(boxes) == 0:
+            return []
+
+        # One device-to-host copy for all boxes
+        return self._boxes_to_detections(
+            boxes.data.cpu().numpy(), scale, pad, frame_shape
+        )
+
+    def _boxes_to_detections(self, data, scale=1.0, pad=(0, 0), frame_shape=None):
+        """
+        Convert an array of boxes into detection dictionaries.
+
+        Args:
+            data: (N, 6+) array with rows x1, y1, x2, y2, then (track id,)
+                  confidence and class
+            scale, pad, frame_shape: As for _result_to_detections()
+        """
+        if len(data) == 0:
+            return []
+
+        xyxy = data[:, :4]
+        if frame_shape is not None:
+            left, top = pad
+            xyxy = (xyxy - (left, top, left, top)) / scale
+            height, width = frame_shape[:2]
+            np.clip(xyxy[:, 0::2], 0, width - 1, out=xyxy[:, 0::2])
+            np.clip(xyxy[:, 1::2], 0, height - 1, out=xyxy[:, 1::2])
+        xyxy = xyxy.astype(int)
+        confs = data[:, -2]
+        cls_ids = data[:, -1].astype(int)
+
+        # Calculate center points for all boxes
+        centers = (xyxy[:, :2] + xyxy[:, 2:]) // 2
+
+        # tolist() yields native Python numbers, which serialize and compare
+        # faster than numpy scalars downstream
+        names = self.model.names
+        return [
+            {
+                "bbox": tuple(bbox),
+                "center": tuple(center),
+                "class_id": cls_id,
+                "class_name": names[cls_id],
+                "confidence": conf,
+            }
+            for bbox, center, conf, cls_id in zip(
+                xyxy.tolist(), centers.tolist(), confs.tolist(), cls_ids.tolist()
+            )
+        ]
@@ -1,3 +1,5 @@
+import math
+
 import numpy as np
 
 
@@ -30,6 +32,28 @@ class PinholeCamera:
         else:
             self.fx = self.fy = focal_length
 
+        self._projection_key = None
+        self._projection_terms = None
+
+    def _get_projection_terms(self):
+        """
+        Intrinsics specialized for projection: (cx, cy, 1/fx, 1/fy).
+
+        The reciprocals turn the per-point divisions into multiplications and
+        are only recomputed when the intrinsics change, e.g. after loading a
+        calibration file.
+        """
+        key = (self.fx, self.fy, self.cx, self.cy)
+        if key != self._projection_key:
+            self._projection_key = key
+            self._projection_terms = (
+                float(self.cx),
+                float(self.cy),
+                1.0 / self.fx,
+                1.0 / self.fy,
+            )
+        return self._projection_terms
+
     def pixel_to_3d(self, x, y, depth, normalized_depth=True, depth_scale=5.0):
         """
         Project pixel coordinates to 3D world coordinates.
@@ -55,8 +79,9 @@ class PinholeCamera:
             )
             return None
 
-        # Validate depth input
-        if depth is None or np.isnan(depth) or np.isinf(depth) or depth <= 0:
+        # Validate depth input; plain comparisons avoid numpy scalar dispatch and
+        # also reject NaN, which fails every comparison
+        if not 0.0 < depth < math.inf:
             print(f"Invalid depth value: {depth}")
             return None
 
@@ -81,11 +106,12 @@ class PinholeCamera:
                 Z = 1000  # Clamp to maximum
 
             # Apply pinhole camera model
-            X = float(x - self.cx) * Z / self.fx
-            Y = float(y - self.cy) * Z / self.fy
+            cx, cy, inv_fx, inv_fy = self._get_projection_terms()
+            X = (x - cx) * Z * inv_fx
+            Y = (y - cy) * Z * inv_fy
 
             # Final validation of the calculated coordinates
-            if any(np.isnan([X, Y, Z])) or any(np.isinf([X, Y, Z])):
+            if not all(-math.inf < v < math.inf for v in (X, Y, Z)):
                 print(f"Invalid calculated 3D coordinates: X={X}, Y={Y}, Z={Z}")
                 return None
 
@@ -107,6 +133,45 @@ class PinholeCamera:
             print(f"Error in pixel_to_3d calculation: {e}, depth={depth}")
             return None
 
+    def pixels_to_3d(self, x, y, depth, normalized_depth=True, depth_scale=5.0):
+        """
+        Project many pixels to 3D world coordinates at once.
+
+        Vectorized counterpart of pixel_to_3d with the same clamping rules.
+
+        Args:
+            x, y: Arrays of pixel coordinates
+            depth: Array of depth values at those pixels
+            normalized_depth: Whether depth is normalized (0-1)
+            depth_scale: Scaling factor for normalized depth
+
+        Returns:
+            points: (N, 3) float array of X, Y, Z; rows are NaN where the depth
+                    is invalid
+        """
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        depth = np.asarray(depth, dtype=np.float64)
+
+        # NaN, infinite and non-positive depths have no valid projection
+        valid = np.isfinite(depth) & (depth > 0)
+
+        # Convert normalized depth to metric depth if needed
+        Z = np.clip(depth, 0, 1) * depth_scale if normalized_depth else depth.copy()
+        valid &= Z > 0
+        np.minimum(Z, 1000, out=Z)  # Assume max depth of 1000m
+
+        # Apply pinhole camera model
+        cx, cy, inv_fx, inv_fy = self._get_projection_terms()
+        points = np.empty((*depth.shape, 3))
+        points[..., 0] = (x - cx) * (Z * inv_fx)
+        points[..., 1] = (y - cy) * (Z * inv_fy)
+        points[..., 2] = Z
+
+        valid &= np.isfinite(points).all(axis=-1)
+        points[~valid] = np.nan
+        return points
+
     def load_calibration(self, calibration_file):
         """
         Load camera calibration from file.
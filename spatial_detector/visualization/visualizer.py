@@ -20,7 +20,7 @@ class Visualizer:
         self.show_labels = show_labels
         self.depth_map_size = depth_map_size
 
-    def draw_detections(self, frame, detections, positions_3d=None):
+    def draw_detections(self, frame, detections, positions_3d=None, copy=True):
         """
         Draw detected objects on frame.
 
@@ -28,6 +28,8 @@ class Visualizer:
             frame: Original RGB frame
             detections: List of detection dictionaries
             positions_3d: List of (X, Y, Z) positions corresponding to detections
+            copy: Draw on a copy of the frame; pass False to draw in place when
+                  the caller owns the frame
 
         Returns:
             annotated_frame: Frame with visualizations
@@ -38,17 +40,18 @@ class Visualizer:
 
         if not isinstance(detections, list):
             print(f"Error: detections is not a list: {type(detections)}")
-            return frame.copy()
+            return frame.copy() if copy else frame
 
         if len(detections) == 0:
-            return frame.copy()
+            return frame.copy() if copy else frame
 
         # Safety check - ensure we're working with a copy, not the original
-        try:
-            annotated_frame = frame.copy()
-        except Exception as e:
-            print(f"Error copying frame: {e}")
-            annotated_frame = frame
+        annotated_frame = frame
+        if copy:
+            try:
+                annotated_frame = frame.copy()
+            except Exception as e:
+                print(f"Error copying frame: {e}")
 
         # Draw each detection
         for i, detection in enumerate(detections):
@@ -100,7 +103,8 @@ class Visualizer:
                 if position_3d is not None and len(position_3d) >= 3:
                     try:
                         X, Y, Z = (float(v) for v in position_3d[:3])
-                        if not any(np.isnan([X, Y, Z])):
+                        # v == v is False only for NaN
+                        if X == X and Y == Y and Z == Z:
                             depth_info = f" {Z:.1f}m"
                             label_text += depth_info
                     except (ValueError, TypeError) as e:
@@ -165,13 +169,41 @@ class Visualizer:
 
         return annotated_frame
 
-    def add_depth_visualization(self, frame, depth_normalized):
+    def compose(self, frame, detections, positions_3d=None, depth=None):
+        """
+        Draw detections and the depth thumbnail directly onto the frame.
+
+        Every overlay is drawn in place, so no intermediate full-frame images
+        are created; the caller must own the frame.
+
+        Args:
+            frame: Original RGB frame, modified in place
+            detections: List of detection dictionaries
+            positions_3d: List of (X, Y, Z) positions corresponding to detections
+            depth: Depth map for the corner thumbnail, or None to skip it
+
+        Returns:
+            composed_frame: The frame with all overlays drawn
+        """
+        if frame is None:
+            print("Error: Frame is None in compose")
+            return None
+
+        frame = self.draw_detections(frame, detections, positions_3d, copy=False)
+        if depth is not None:
+            frame = self.add_depth_visualization(frame, depth, copy=False)
+        return frame
+
+    def add_depth_visualization(self, frame, depth_normalized, copy=True):
         """
         Add depth map visualization to corner of frame.
 
         Args:
             frame: Original or annotated frame
-            depth_normalized: Normalized depth map (0-1)
+            depth_normalized: Depth map; the thumbnail is min-max stretched, so
+                              a raw map works as well as a normalized one
+            copy: Draw on a copy of the frame; pass False to draw in place when
+                  the caller owns the frame
 
         Returns:
             frame_with_depth: Frame with depth visualization
@@ -196,28 +228,25 @@ class Visualizer:
                 )
                 return frame
 
-            # Make a copy to avoid modifying original
-            depth_for_viz = depth_normalized.copy()
-
-            # Ensure in 0-1 range
-            if depth_for_viz.max() > 0:
-                depth_for_viz = (depth_for_viz - depth_for_viz.min()) / (
-                    depth_for_viz.max() - depth_for_viz.min()
-                )
-
-            # Apply colormap to depth
-            depth_colormap = cv2.applyColorMap(
-                (depth_for_viz * 255).astype(np.uint8), cv2.COLORMAP_JET
-            )
-
-            # Resize depth map for corner display
+            # Resize depth map for corner display before colorizing, so the
+            # normalization and colormap only touch the thumbnail pixels
             h, w = frame.shape[:2]
             depth_h = int(h * self.depth_map_size)
             depth_w = int(w * self.depth_map_size)
-            small_depth = cv2.resize(depth_colormap, (depth_w, depth_h))
+            depth_small = cv2.resize(
+                depth_normalized, (depth_w, depth_h), interpolation=cv2.INTER_AREA
+            )
+
+            # Stretch to 0-255 (writes a new array, the input is left untouched)
+            depth_u8 = cv2.normalize(
+                depth_small, None, 0, 255, cv2.NORM_MINMAX, dtype=cv2.CV_8U
+            )
+
+            # Apply colormap to depth
+            small_depth = cv2.applyColorMap(depth_u8, cv2.COLORMAP_JET)
 
             # Add depth map to corner of frame
-            frame_with_depth = frame.copy()
+            frame_with_depth = frame.copy() if copy else frame
             frame_with_depth[0:depth_h, 0:depth_w] = small_depth
 
             # Add border around depth map
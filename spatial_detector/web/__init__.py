@@ -1 +1,7 @@
 # Web interface module for Spatial Detector
+import os
+
+# Socket.IO async mode: "threading" (Werkzeug threads), "eventlet" or "gevent".
+# It is read from the environment because the eventlet/gevent monkey patching
+# in __main__ has to run before the server module is imported.
+ASYNC_MODE = os.environ.get("SPATIAL_DETECTOR_ASYNC_MODE", "threading")
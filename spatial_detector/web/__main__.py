@@ -3,8 +3,28 @@ Main entry point for the Spatial Detector web interface
 """
 
 import argparse
+import os
 import sys
 
+from spatial_detector.web import ASYNC_MODE
+
+# Optionally serve Socket.IO from an eventlet/gevent hub instead of Werkzeug
+# threads. Monkey patching must happen before anything else imports socket or
+# threading, so it is done here, ahead of the server import.
+if ASYNC_MODE == "eventlet":
+    import eventlet
+
+    eventlet.monkey_patch()
+elif ASYNC_MODE == "gevent":
+    from gevent import monkey
+
+    monkey.patch_all()
+
+# Leave cores free for the Socket.IO reactor thread. OpenMP reads this when
+# numpy/torch are first loaded, so it has to be set before the server module
+# imports them. An explicit value in the environment still wins.
+os.environ.setdefault("OMP_NUM_THREADS", str(max(1, (os.cpu_count() or 1) - 2)))
+
 from spatial_detector.web.server import WebServer
 
 
@@ -39,6 +59,20 @@ def main():
         help="Custom static files directory path",
     )
 
+    parser.add_argument(
+        "--inference-process",
+        action="store_true",
+        help="Run detection and depth models in a separate worker process",
+    )
+
+    parser.add_argument(
+        "--socket-serializer",
+        choices=["msgpack", "json"],
+        default="json",
+        help="Socket.IO packet serializer; msgpack sends detection payloads "
+        "as binary (default: json)",
+    )
+
     args = parser.parse_args()
 
     try:
@@ -47,12 +81,14 @@ def main():
             port=args.port,
             static_folder=args.static,
             template_folder=args.templates,
+            inference_process=args.inference_process,
+            socket_serializer=args.socket_serializer,
         )
         print(
             f"Starting Spatial Detector Web Interface on http://{args.host}:{args.port}"
         )
         print("Press Ctrl+C to exit")
-        server.start()
+        server.start(debug=args.debug)
     except KeyboardInterrupt:
         print("\nShutting down server...")
         if hasattr(server, "shutdown"):
@@ -0,0 +1,219 @@
+"""
+Out-of-process inference for the Spatial Detector web server.
+Runs YOLO detection and MiDaS depth estimation in a dedicated worker process so
+that model pre/post-processing does not hold the server's GIL.
+"""
+
+import multiprocessing as mp
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Per-process state, only populated inside the worker process
+_WORKER_MODELS = {}
+_ATTACHED_BUFFERS = {}
+
+
+def _get_models():
+    """Load the detector and depth estimator once per worker process"""
+    if not _WORKER_MODELS:
+        from spatial_detector.depth import midas_depth
+        from spatial_detector.detection import yolo_detector
+
+        _WORKER_MODELS["detector"] = yolo_detector.YOLODetector()
+        _WORKER_MODELS["depth"] = midas_depth.MiDaSDepthEstimator()
+    return _WORKER_MODELS["detector"], _WORKER_MODELS["depth"]
+
+
+def _attach(name):
+    """Attach to a shared memory segment owned by the server process"""
+    shm = _ATTACHED_BUFFERS.get(name)
+    if shm is None:
+        shm = shared_memory.SharedMemory(name=name)
+        _ATTACHED_BUFFERS[name] = shm
+    return shm
+
+
+def _release_stale(active_names):
+    """Close handles to segments the server has since replaced"""
+    for name in list(_ATTACHED_BUFFERS):
+        if name not in active_names:
+            _ATTACHED_BUFFERS.pop(name).close()
+
+
+def _warmup():
+    """Load models ahead of the first frame so load errors surface early"""
+    _get_models()
+    return True
+
+
+def _run_inference(frame_name, depth_name, shape, active_names):
+    """
+    Run detection and depth estimation on the frame in shared memory.
+
+    active_names holds the segments of every slot, so handles to the slot not
+    used by this frame stay attached for the next one.
+    """
+    _release_stale(active_names)
+    detector, depth_estimator = _get_models()
+
+    frame_shm = _attach(frame_name)
+    depth_shm = _attach(depth_name)
+    frame = np.ndarray(shape, dtype=np.uint8, buffer=frame_shm.buf)
+    depth_out = np.ndarray(shape[:2], dtype=np.float32, buffer=depth_shm.buf)
+
+    detections = detector.detect(frame)
+    depth_map, _ = depth_estimator.estimate_depth(frame, normalize=False)
+    depth_out[...] = depth_map
+
+    return detections
+
+
+class InferenceProcess:
+    """
+    Runs the detection models in a single spawned worker process.
+    Frames and depth maps are exchanged through shared memory so only the small
+    detection list is pickled between processes. Two buffer slots are used so
+    the caller can post-process one frame while the worker runs the next.
+    """
+
+    NUM_SLOTS = 2
+
+    def __init__(self):
+        """Start the worker process"""
+        self._executor = ProcessPoolExecutor(
+            max_workers=1, mp_context=mp.get_context("spawn")
+        )
+        self._slots = []  # (frame_shm, depth_shm) pairs
+        self._generation = 0  # Bumped whenever the slots are reallocated
+        self._in_flight = Counter()  # Uncollected tickets per generation
+        self._draining = {}  # Released generation -> segments awaiting collect
+        self._retired = []  # Unlinked segments that may still be referenced
+        self._next_slot = 0
+        self._shape = None
+
+    def warmup(self, timeout=None):
+        """
+        Load the models in the worker process.
+
+        Raises:
+            Exception: Any error raised while loading the models
+        """
+        return self._executor.submit(_warmup).result(timeout=timeout)
+
+    def _ensure_buffers(self, shape):
+        """(Re)allocate the shared frame and depth buffers for a frame shape"""
+        if self._shape == shape:
+            return
+        self._release_buffers()
+        height, width = shape[:2]
+        frame_size = int(np.prod(shape))
+        depth_size = height * width * np.dtype(np.float32).itemsize
+        self._slots = [
+            (
+                shared_memory.SharedMemory(create=True, size=frame_size),
+                shared_memory.SharedMemory(create=True, size=depth_size),
+            )
+            for _ in range(self.NUM_SLOTS)
+        ]
+        self._generation += 1
+        self._next_slot = 0
+        self._shape = shape
+
+    def _release_buffers(self):
+        """Release the current shared buffers and close previously retired ones"""
+        # Unlinked segments can no longer back a pending ticket; a caller may
+        # still hold a view of the last collected depth map, so closing is
+        # retried on the next release
+        still_referenced = []
+        for shm in self._retired:
+            try:
+                shm.close()
+            except BufferError:
+                # A caller still holds a view; retry on the next release
+                still_referenced.append(shm)
+        self._retired = still_referenced
+
+        segments = [shm for slot in self._slots for shm in slot]
+        if self._in_flight[self._generation]:
+            # A submitted frame may not have reached the worker yet; unlinking
+            # now would make its attach fail, so wait until it is collected
+            self._draining[self._generation] = segments
+        else:
+            self._unlink(segments)
+        self._slots = []
+        self._shape = None
+
+    def _unlink(self, segments):
+        """Unlink segments and retire them until they can be closed"""
+        for shm in segments:
+            shm.unlink()
+            self._retired.append(shm)
+
+    def submit(self, frame):
+        """
+        Start detection and depth estimation on a frame in the worker process.
+
+        Args:
+            frame: BGR image as uint8 numpy array
+
+        Returns:
+            ticket: Opaque handle to pass to collect()
+        """
+        shape = tuple(frame.shape)
+        self._ensure_buffers(shape)
+        frame_shm, depth_shm = self._slots[self._next_slot]
+        self._next_slot = (self._next_slot + 1) % len(self._slots)
+
+        frame_view = np.ndarray(shape, dtype=np.uint8, buffer=frame_shm.buf)
+        np.copyto(frame_view, frame)
+
+        active_names = frozenset(shm.name for slot in self._slots for shm in slot)
+        future = self._executor.submit(
+            _run_inference, frame_shm.name, depth_shm.name, shape, active_names
+        )
+        self._in_flight[self._generation] += 1
+        return future, depth_shm, shape, self._generation
+
+    def collect(self, ticket):
+        """
+        Wait for a submitted frame's results.
+
+        Returns:
+            detections: List of detection dictionaries
+            depth_map: Raw (unnormalized) depth map. This is a view of shared
+                memory and is only valid until its slot is reused, i.e. for
+                NUM_SLOTS - 1 further calls to submit().
+        """
+        future, depth_shm, shape, generation = ticket
+        try:
+            detections = future.result()
+        finally:
+            self._in_flight[generation] -= 1
+            if not self._in_flight[generation]:
+                del self._in_flight[generation]
+                if generation in self._draining:
+                    self._unlink(self._draining.pop(generation))
+        depth_map = np.ndarray(shape[:2], dtype=np.float32, buffer=depth_shm.buf)
+        return detections, depth_map
+
+    def done(self, ticket):
+        """Whether a submitted frame's results can be collected without waiting"""
+        return ticket[0].done()
+
+    def infer(self, frame):
+        """Run detection and depth estimation on a frame and wait for the result"""
+        return self.collect(self.submit(frame))
+
+    def close(self):
+        """Stop the worker process and free shared memory"""
+        self._executor.shutdown(wait=True)
+        self._in_flight.clear()
+        for segments in self._draining.values():
+            self._unlink(segments)
+        self._draining = {}
+        self._release_buffers()
+        # Nothing is pending any more, so close the final generation as well
+        self._release_buffers()
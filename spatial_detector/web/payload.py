@@ -0,0 +1,97 @@
+"""
+Binary detection payload sent to web clients.
+Kept free of the model imports so the wire format can be checked on its own;
+static/js/modules/detection-processor.js mirrors the record layout.
+"""
+
+import time
+
+import numpy as np
+
+# Fixed 36-byte little-endian layout of one detection in the binary payload;
+# the padding keeps every record 4-byte aligned for Float32Array views. The
+# byte offsets are repeated in DETECTION_RECORD in detection-processor.js,
+# so change both together (tests/test_detection_payload.py checks them).
+DETECTION_RECORD_DTYPE = np.dtype(
+    [
+        ("confidence", "<f4"),
+        ("bbox", "<f4", (4,)),
+        ("position_3d", "<f4", (3,)),
+        ("class_id", "<u2"),
+        ("_pad", "<u2"),
+    ]
+)
+
+
+def pack_detections(detections, logger):
+    """
+    Pack detections into a binary payload for clients.
+
+    Args:
+        detections: List of detection dictionaries
+        logger: Logger for dropped detections
+
+    Returns:
+        Dictionary with 'records' (n DETECTION_RECORD_DTYPE records as bytes;
+        positions are NaN when unknown), 'labels', 'n' and 'timestamp', or
+        None if nothing is valid
+    """
+    usable = []
+    for d in detections:
+        bbox = d.get("bbox")
+        if not bbox or len(bbox) != 4:
+            logger.warning(f"Detection missing valid bbox: {d.get('class_name')}")
+            continue
+        usable.append(d)
+    if not usable:
+        return None
+
+    try:
+        bboxes = np.asarray([d["bbox"] for d in usable], dtype=np.float64)
+    except (ValueError, TypeError):
+        logger.warning("Non-numeric values in detection bboxes")
+        return None
+
+    # Ensure bbox values are within frame
+    in_frame = (bboxes[:, :2] >= 0).all(axis=1)
+    in_frame &= (bboxes[:, 2:] <= 5000).all(axis=1)
+    if not in_frame.all():
+        logger.warning(
+            f"Dropping {int((~in_frame).sum())} detections with out-of-bounds bbox"
+        )
+        usable = [d for d, keep in zip(usable, in_frame.tolist()) if keep]
+        bboxes = bboxes[in_frame]
+        if not usable:
+            return None
+
+    count = len(usable)
+    records = np.zeros(count, dtype=DETECTION_RECORD_DTYPE)
+    records["bbox"] = bboxes
+    records["confidence"] = np.fromiter(
+        (d.get("confidence", 0.0) for d in usable), dtype=np.float32, count=count
+    )
+    records["class_id"] = np.fromiter(
+        (d.get("class_id", 0) for d in usable), dtype=np.uint16, count=count
+    )
+
+    # Missing or malformed positions become NaN rows
+    positions = np.full((count, 3), np.nan)
+    for i, d in enumerate(usable):
+        pos = d.get("position_3d")
+        if isinstance(pos, (list, tuple)) and len(pos) >= 3:
+            positions[i] = pos[:3]
+    # NaN fails the comparison, so this also rejects non-finite rows
+    valid_positions = (np.abs(positions) < 1000).all(axis=1)
+    positions[~valid_positions] = np.nan
+
+    if not valid_positions.any():
+        logger.warning("No valid position_3d data in detections")
+    records["position_3d"] = positions
+
+    # Labels are the only variable-length field, so they travel separately
+    return {
+        "records": records.tobytes(),
+        "labels": [d.get("class_name", "unknown") for d in usable],
+        "n": count,
+        "timestamp": time.time(),
+    }
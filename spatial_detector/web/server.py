@@ -4,25 +4,37 @@ Provides a web interface for using the detector with iPhone camera input.
 """
 
 import base64
+import binascii
 import logging
 import os
 import platform
 import socket
 import threading
 import time
+from functools import lru_cache
 from io import BytesIO
 
 import cv2
 import numpy as np
+import orjson
 import qrcode
+import torch
 from flask import Flask, Response, jsonify, render_template, request
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
-from flask_socketio import SocketIO
+from flask_socketio import SocketIO, join_room
 
 from spatial_detector.depth import midas_depth
 from spatial_detector.detection import yolo_detector
 from spatial_detector.projection import camera_model
 from spatial_detector.visualization import visualizer
+from spatial_detector.web import ASYNC_MODE
+from spatial_detector.web.payload import pack_detections
+
+try:
+    import netifaces
+except ImportError:  # Optional, falls back to a UDP socket probe
+    netifaces = None
 
 # Configure logging
 logging.basicConfig(
@@ -30,6 +42,135 @@ logging.basicConfig(
 )
 
 
+# numpy scalars/arrays show up in detection payloads, so serialize them natively
+_ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson"""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=_ORJSON_OPTIONS).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
+class _OrjsonSocketCodec:
+    """orjson wrapper exposing the json-module interface python-socketio expects"""
+
+    @staticmethod
+    def dumps(obj, *args, **kwargs):
+        return orjson.dumps(obj, option=_ORJSON_OPTIONS).decode("utf-8")
+
+    @staticmethod
+    def loads(s, *args, **kwargs):
+        return orjson.loads(s)
+
+
+# Socket.IO room every client joins; broadcasts target it so each payload is
+# encoded once for all recipients
+VIEWERS_ROOM = "viewers"
+
+# Clients are asked to slow down to THROTTLE_TARGET_FPS once more than
+# THROTTLE_FRAME_SKEW received frames are waiting behind the last processed one
+THROTTLE_FRAME_SKEW = 2
+THROTTLE_TARGET_FPS = 10
+
+# Detection results are coalesced into one emit once this many frames are
+# pending or the oldest pending result is this old (seconds)
+DETECTION_BATCH_SIZE = 4
+DETECTION_BATCH_INTERVAL = 0.05
+
+# While a frame is in flight in the inference worker, process_frames checks
+# this often (seconds) whether it finished, so its results are not held back
+# until the next frame arrives
+PENDING_RESULT_POLL = 0.01
+
+# How long a discovered local IP address is reused before looking it up again
+_LOCAL_IP_TTL = 60.0
+# Seconds between checks for a changed IP before the QR code is rebuilt
+_CONNECTION_INFO_TTL = 30.0
+
+
+def _discover_local_ip():
+    """Find the LAN address of the default route interface"""
+    if netifaces is not None:
+        try:
+            gateways = netifaces.gateways()
+            interface = gateways["default"][netifaces.AF_INET][1]
+            return netifaces.ifaddresses(interface)[netifaces.AF_INET][0]["addr"]
+        except (KeyError, IndexError, ValueError):
+            pass
+
+    # Connecting a UDP socket sends no packets but selects the outbound interface
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        s.connect(("8.8.8.8", 80))
+        return s.getsockname()[0]
+    finally:
+        s.close()
+
+
+@lru_cache(maxsize=1)
+def _cached_local_ip(ttl_bucket):
+    """Memoize the local IP; ttl_bucket changes every _LOCAL_IP_TTL seconds"""
+    try:
+        return _discover_local_ip()
+    except OSError as e:
+        logging.getLogger("spatial_detector.web").warning(
+            f"Could not determine local IP address: {e}"
+        )
+        return None
+
+
+def get_local_ip():
+    """Return the machine's LAN IP address, or None if it cannot be found"""
+    return _cached_local_ip(int(time.monotonic() // _LOCAL_IP_TTL))
+
+
+# Multipart headers preceding each JPEG on /stream
+_MJPEG_PART_HEADER = b"--frame\r\nContent-Type: image/jpeg\r\n\r\n"
+
+# Prefix of the data URLs produced by canvas.toDataURL("image/jpeg")
+_JPEG_DATA_URL_PREFIX = "data:image/jpeg;base64,"
+_JPEG_DATA_URL_PREFIX_LEN = len(_JPEG_DATA_URL_PREFIX)
+
+
+def _decode_frame(image):
+    """
+    Decode a frame received from a client.
+
+    Args:
+        image: JPEG bytes, or a base64 data URL ("data:image/jpeg;base64,...")
+
+    Returns:
+        BGR image as numpy array, or None if the data is not a valid image
+    """
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        # Binary Socket.IO attachment, no base64 step needed
+        raw = image
+    else:
+        # The JPEG prefix has a known length, so the payload offset only has
+        # to be searched for other image types
+        if image.startswith(_JPEG_DATA_URL_PREFIX):
+            start = _JPEG_DATA_URL_PREFIX_LEN
+        else:
+            start = image.index(",") + 1
+        # a2b_base64 is the C decoder behind base64.b64decode without the
+        # Python-level argument handling
+        raw = binascii.a2b_base64(image[start:])
+    return cv2.imdecode(np.frombuffer(raw, np.uint8), cv2.IMREAD_COLOR)
+
+
+def _limit_inference_threads():
+    """Cap OpenCV and torch worker threads so inference leaves the reactor a core"""
+    num_threads = max(1, (os.cpu_count() or 1) - 2)
+    cv2.setNumThreads(num_threads)
+    torch.set_num_threads(num_threads)
+    return num_threads
+
+
 class WebServer:
     """Web server for Spatial Detector application"""
 
@@ -39,6 +180,8 @@ class WebServer:
         port: int = 5011,
         static_folder: str = None,
         template_folder: str = None,
+        inference_process: bool = False,
+        socket_serializer: str = "json",
     ):
         # Detect platform for platform-specific features
         self.is_mac = platform.system() == "Darwin"
@@ -58,8 +201,22 @@ class WebServer:
             static_folder=self.static_folder,
             template_folder=self.template_folder,
         )
+        self.app.json = OrjsonProvider(self.app)
         CORS(self.app)
-        self.socketio = SocketIO(self.app, cors_allowed_origins="*")
+
+        # msgpack packs the float-heavy detection payloads as binary; the
+        # client parser is vendored under static/js/vendor and clients learn
+        # which parser to load from /api/status
+        if socket_serializer == "msgpack":
+            socket_options = {"serializer": "msgpack"}
+        elif socket_serializer == "json":
+            socket_options = {"json": _OrjsonSocketCodec}
+        else:
+            raise ValueError(f"Unsupported socket serializer: {socket_serializer}")
+        self.socket_serializer = socket_serializer
+        self.socketio = SocketIO(
+            self.app, cors_allowed_origins="*", async_mode=ASYNC_MODE, **socket_options
+        )
         self.host = host
         self.port = port
 
@@ -73,13 +230,47 @@ class WebServer:
         self.camera = None
         self.vis = None
 
+        # Optionally run the models in a separate process to avoid GIL contention
+        self.inference_process = inference_process
+        self._inference = None
+
         # Stream management
-        self.frame_buffer = None
+        self.frame_buffer = None  # Latest processed frame, shown on /stream
+        # Single-slot hand-off from handle_frame to process_frames. The newest
+        # frame replaces any unprocessed one and ownership moves with the swap,
+        # so neither side needs to copy it.
+        self._latest_frame = None
+        self._latest_lock = threading.Lock()
+        # Set by handle_frame whenever a new client frame is stored
+        self._frame_ready = threading.Event()
+        # Sequence numbers of the newest received and processed frames, used to
+        # throttle clients that send faster than inference runs
+        self._last_seen_seq = 0
+        self._last_processed_seq = 0
+        # Signals MJPEG viewers when process_frames publishes a new frame
+        self._new_frame_cond = threading.Condition()
+        self._frame_seq = 0
+        self._frame_jpeg = None  # Multipart part holding the latest JPEG
+        self._mjpeg_viewers = 0  # Open /stream responses, guarded by the condition
+        self._shutdown = False  # Ends open /stream responses
+        # Detection payloads waiting to be emitted as one batch
+        self._pending_results = []
+        self._last_emit = time.monotonic()
         self.processing_thread = None
+        # Ident of the thread (or green thread) running process_frames, None
+        # once the loop has returned
+        self._processing_ident = None
         self.is_processing = False
         self.client_streams = {}
         self.active_stream_id = None
 
+        # Mobile connection info, built up front so status polls only return
+        # the cached copy
+        self._connection_info = {}
+        self._connection_checked = 0.0
+        if self.is_mac:
+            self._get_connection_info()
+
         # Configure routes
         self._configure_routes()
         self._configure_socket_events()
@@ -97,42 +288,20 @@ class WebServer:
 
         @self.app.route("/api/status")
         def status():
-            # Generate connection info for mobile devices
-            connection_info = {}
-            if self.is_mac:
-                # Get local IP address
-                try:
-                    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-                    s.connect(("8.8.8.8", 80))
-                    local_ip = s.getsockname()[0]
-                    s.close()
-
-                    # Generate QR code for connection
-                    connection_url = f"http://{local_ip}:{self.port}"
-                    img = qrcode.make(connection_url)
-                    buffered = BytesIO()
-                    img.save(buffered, format="PNG")
-                    self.qr_code_data = base64.b64encode(buffered.getvalue()).decode(
-                        "utf-8"
-                    )
-
-                    connection_info = {
-                        "local_ip": local_ip,
-                        "port": self.port,
-                        "url": connection_url,
-                        "qr_code": self.qr_code_data,
-                    }
-                except Exception as e:
-                    self.logger.error(f"Error generating connection info: {e}")
+            # Connection info for mobile devices
+            connection_info = self._get_connection_info() if self.is_mac else {}
 
             return jsonify(
                 {
                     "status": "running",
                     "connected_devices": list(self.client_streams.keys()),
                     "active_stream": self.active_stream_id,
-                    "detector_ready": self.detector is not None,
-                    "depth_ready": self.depth_estimator is not None,
+                    "detector_ready": self.detector is not None
+                    or self._inference is not None,
+                    "depth_ready": self.depth_estimator is not None
+                    or self._inference is not None,
                     "is_mac": self.is_mac,
+                    "socket_serializer": self.socket_serializer,
                     "connection_info": connection_info,
                 }
             )
@@ -148,23 +317,53 @@ class WebServer:
             """Video streaming route for a specific stream ID"""
 
             def generate():
-                while True:
-                    if (
-                        self.frame_buffer is not None
-                        and self.active_stream_id == stream_id
-                    ):
-                        _, jpeg = cv2.imencode(".jpg", self.frame_buffer)
-                        yield (
-                            b"--frame\r\n"
-                            b"Content-Type: image/jpeg\r\n\r\n"
-                            + jpeg.tobytes()
-                            + b"\r\n"
-                        )
-                    time.sleep(0.05)
-
-            return Response(
-                generate(), mimetype="multipart/x-mixed-replace; boundary=frame"
+                last_seq = -1
+                # Streams may be opened before their client registers; once
+                # seen, the response ends when the stream is unregistered
+                registered = False
+                # Registered viewers make _publish_frame encode JPEGs
+                with self._new_frame_cond:
+                    self._mjpeg_viewers += 1
+                try:
+                    while not self._shutdown:
+                        # Block until a new processed frame is published instead
+                        # of polling; the timeout bounds how long a closed
+                        # stream keeps this generator alive
+                        with self._new_frame_cond:
+                            self._new_frame_cond.wait_for(
+                                lambda seq=last_seq: self._frame_seq != seq
+                                or self._shutdown,
+                                timeout=1.0,
+                            )
+                            if self._shutdown:
+                                return
+                            last_seq = self._frame_seq
+                            part = self._frame_jpeg
+
+                        if stream_id in self.client_streams:
+                            registered = True
+                        elif registered:
+                            self.logger.debug("Closing MJPEG stream %s", stream_id)
+                            return
+
+                        # Parts are built once in _publish_frame and shared by
+                        # every viewer
+                        if part is not None and self.active_stream_id == stream_id:
+                            yield part
+                finally:
+                    with self._new_frame_cond:
+                        self._mjpeg_viewers -= 1
+
+            response = Response(
+                generate(),
+                mimetype="multipart/x-mixed-replace; boundary=frame",
+                direct_passthrough=True,
             )
+            # Disable intermediary buffering so each part is flushed immediately
+            response.headers["Cache-Control"] = "no-store"
+            response.headers["X-Accel-Buffering"] = "no"
+            response.headers["X-Content-Type-Options"] = "nosniff"
+            return response
 
         @self.app.route("/api/config", methods=["GET", "POST"])
         def config():
@@ -186,12 +385,55 @@ class WebServer:
                         self.vis.show_depth = data["show_depth"]
                 return jsonify({"status": "updated"})
 
+    def _get_connection_info(self):
+        """
+        Return the mobile connection info, rebuilding the QR code only when
+        the local IP has changed.
+
+        Returns:
+            Dictionary with 'local_ip', 'port', 'url' and 'qr_code', or an
+            empty dictionary if the local IP cannot be determined
+        """
+        now = time.monotonic()
+        if (
+            self._connection_info
+            and now - self._connection_checked < _CONNECTION_INFO_TTL
+        ):
+            return self._connection_info
+        self._connection_checked = now
+
+        try:
+            local_ip = get_local_ip()
+            if local_ip is None:
+                raise OSError("local IP address unavailable")
+            if local_ip == self._connection_info.get("local_ip"):
+                return self._connection_info
+
+            # Generate QR code for connection
+            connection_url = f"http://{local_ip}:{self.port}"
+            img = qrcode.make(connection_url)
+            buffered = BytesIO()
+            img.save(buffered, format="PNG")
+            self.qr_code_data = base64.b64encode(buffered.getvalue()).decode("utf-8")
+
+            self._connection_info = {
+                "local_ip": local_ip,
+                "port": self.port,
+                "url": connection_url,
+                "qr_code": self.qr_code_data,
+            }
+        except Exception as e:
+            self.logger.error(f"Error generating connection info: {e}")
+
+        return self._connection_info
+
     def _configure_socket_events(self):
         """Configure Socket.IO events"""
 
         @self.socketio.on("connect")
         def handle_connect():
             self.logger.info(f"Client connected: {request.sid}")
+            join_room(VIEWERS_ROOM)
 
         @self.socketio.on("disconnect")
         def handle_disconnect(sid=None):
@@ -270,17 +512,21 @@ class WebServer:
                 return {"status": "ignored", "reason": "not_active_stream"}
 
             try:
-                # Decode base64 image
-                img_data = data["image"].split(",")[1]
-                import base64
-
-                nparr = np.frombuffer(base64.b64decode(img_data), np.uint8)
-                frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+                # Decode JPEG bytes or base64 data URL
+                frame = _decode_frame(data["image"])
 
                 # Store the frame for processing
                 if frame is not None:
-                    self.frame_buffer = frame
+                    with self._latest_lock:
+                        self._latest_frame = frame
+                        self._last_seen_seq += 1
+                        skew = self._last_seen_seq - self._last_processed_seq
+                    self._frame_ready.set()
                     self.client_streams[request.sid]["last_active"] = time.time()
+                    # Only the newest frame is kept, so frames beyond the skew
+                    # are dropped anyway; ask the client not to send them
+                    if skew > THROTTLE_FRAME_SKEW:
+                        return {"status": "throttle", "target_fps": THROTTLE_TARGET_FPS}
                     return {"status": "received"}
                 else:
                     return {"status": "error", "reason": "invalid_frame"}
@@ -306,7 +552,10 @@ class WebServer:
             client_id = request.sid
             self.logger.info(f"Camera stopped for client: {client_id}")
 
-            # Clear the frame buffer to stop processing
+            # Clear the frame buffers to stop processing
+            with self._latest_lock:
+                self._latest_frame = None
+                self._last_processed_seq = self._last_seen_seq
             self.frame_buffer = None
 
             # If this was the active stream, clear it
@@ -336,6 +585,7 @@ class WebServer:
         self.socketio.emit(
             "initialization_status",
             {"status": "starting", "message": "Starting initialization..."},
+            to=VIEWERS_ROOM,
         )
 
         # Progress callback to report status to clients
@@ -344,11 +594,33 @@ class WebServer:
             self.socketio.emit(
                 "initialization_status",
                 {"status": "progress", "component": component, "message": message},
+                to=VIEWERS_ROOM,
             )
 
         try:
+            # Start the inference worker process if not already done
+            if self.inference_process and self._inference is None:
+                self.socketio.emit(
+                    "initialization_status",
+                    {
+                        "status": "progress",
+                        "component": "detector",
+                        "message": "Loading models in inference process...",
+                    },
+                    to=VIEWERS_ROOM,
+                )
+                from spatial_detector.web import inference_worker
+
+                inference = inference_worker.InferenceProcess()
+                try:
+                    inference.warmup()
+                except Exception:
+                    inference.close()
+                    raise
+                self._inference = inference
+
             # Initialize detector if not already done
-            if self.detector is None:
+            if self.detector is None and not self.inference_process:
                 self.socketio.emit(
                     "initialization_status",
                     {
@@ -356,13 +628,14 @@ class WebServer:
                         "component": "detector",
                         "message": "Loading object detector...",
                     },
+                    to=VIEWERS_ROOM,
                 )
                 self.detector = yolo_detector.YOLODetector(
                     progress_callback=progress_callback
                 )
 
             # Initialize depth estimator if not already done
-            if self.depth_estimator is None:
+            if self.depth_estimator is None and not self.inference_process:
                 self.socketio.emit(
                     "initialization_status",
                     {
@@ -370,6 +643,7 @@ class WebServer:
                         "component": "depth",
                         "message": "Loading depth estimator...",
                     },
+                    to=VIEWERS_ROOM,
                 )
                 self.depth_estimator = midas_depth.MiDaSDepthEstimator(
                     progress_callback=progress_callback
@@ -407,29 +681,64 @@ class WebServer:
                     "status": "complete",
                     "message": "All components initialized successfully",
                 },
+                to=VIEWERS_ROOM,
             )
 
         except Exception as e:
             error_msg = f"Error initializing components: {e}"
             self.logger.error(error_msg)
             self.socketio.emit(
-                "initialization_status", {"status": "error", "message": error_msg}
+                "initialization_status",
+                {"status": "error", "message": error_msg},
+                to=VIEWERS_ROOM,
             )
 
     def process_frames(self):
         """Process frames from the active stream"""
         self.logger.info("Starting frame processing thread")
+        self._processing_ident = threading.get_ident()
+        try:
+            self._process_frames_loop()
+        finally:
+            self._processing_ident = None
+
+    def _process_frames_loop(self):
+        """Body of process_frames, runs until is_processing is cleared"""
+        # With the inference worker, the previous frame's results are
+        # post-processed while the worker runs inference on the next frame.
+        # That puts published results one frame behind the newest frame; when
+        # frames arrive slower than inference, the in-flight result is
+        # published as soon as the worker finishes instead
+        pending = None
 
         while self.is_processing:
-            if self.frame_buffer is not None and self.active_stream_id:
+            # Block until handle_frame delivers a new frame; the timeout keeps
+            # the loop responsive to stop requests and to finished inferences
+            timeout = 0.5 if pending is None else PENDING_RESULT_POLL
+            if not self._frame_ready.wait(timeout=timeout):
+                if pending is not None:
+                    if not self._inference.done(pending[1]):
+                        continue
+                    self._finish_pending(pending)
+                    pending = None
+                self._flush_detections()
+                continue
+            self._frame_ready.clear()
+
+            # Take ownership of the newest frame, leaving the slot empty
+            with self._latest_lock:
+                frame, self._latest_frame = self._latest_frame, None
+                seq = self._last_seen_seq
+
+            if frame is not None and self.active_stream_id:
                 # Ensure all required components are initialized before processing
-                if self.camera is None and self.frame_buffer is not None:
+                if self.camera is None:
                     self.logger.warning(
                         "Camera model is None, attempting to initialize before processing"
                     )
                     try:
                         # Get dimensions from the current frame
-                        height, width = self.frame_buffer.shape[:2]
+                        height, width = frame.shape[:2]
                         self.camera = camera_model.PinholeCamera(
                             image_size=(width, height)
                         )
@@ -442,347 +751,320 @@ class WebServer:
                         )
                         # Continue processing but log the error - we'll try again for each detection
                 try:
-                    # Make a copy to avoid race conditions
-                    frame = self.frame_buffer.copy()
-
-                    # Run detection
-                    detections = self.detector.detect(frame)
-
-                    # Estimate depth
-                    depth_map, depth_norm = self.depth_estimator.estimate_depth(frame)
-
-                    # Update frame with visualizations
-                    if self.vis is None:
-                        self.logger.warning("Visualizer is None, reinitializing...")
-                        try:
-                            self.vis = visualizer.Visualizer()
-                            self.logger.info("Visualizer reinitialized successfully")
-                        except Exception as viz_reinit_error:
-                            self.logger.error(
-                                f"Failed to reinitialize visualizer: {viz_reinit_error}"
-                            )
+                    if self._inference is not None:
+                        submitted = (frame, self._inference.submit(frame))
+                        if pending is not None:
+                            self._finish_pending(pending)
+                        pending = submitted
+                    else:
+                        # Run detection and depth estimation
+                        detections, depth_map = self._run_models(frame)
+                        self._handle_results(frame, detections, depth_map)
+                except Exception as e:
+                    self.logger.error(f"Error in processing thread: {e}")
+                # Frames handed to the inference worker count as processed, the
+                # pipeline only ever holds one of them
+                self._last_processed_seq = seq
 
-                    if self.vis:
-                        # Get 3D positions for detections
-                        for detection in detections:
-                            try:
-                                # Get bounding box
-                                bbox = detection.get("bbox")
-                                if not bbox or len(bbox) != 4:
-                                    self.logger.warning(f"Invalid bbox: {bbox}")
-                                    continue
-
-                                # Calculate center point
-                                x1, y1, x2, y2 = (float(v) for v in bbox)
-                                center_x = int((x1 + x2) / 2)
-                                center_y = int((y1 + y2) / 2)
-
-                                # Ensure center point is within frame
-                                if (
-                                    center_x < 0
-                                    or center_y < 0
-                                    or center_x >= frame.shape[1]
-                                    or center_y >= frame.shape[0]
-                                ):
-                                    self.logger.warning(
-                                        f"Center point out of bounds: ({center_x}, {center_y})"
-                                    )
-                                    detection["position_3d"] = None
-                                    continue
-
-                                # Get depth at center of bbox
-                                depth = self.depth_estimator.get_depth_at_point(
-                                    depth_norm, center_x, center_y
-                                )
-                                self.logger.info(
-                                    f"Depth at ({center_x}, {center_y}) for {detection.get('class_name')}: {depth}"
-                                )
-
-                                # Log depth map stats for debugging
-                                if depth_norm is not None:
-                                    self.logger.info(
-                                        f"Depth map stats - min: {np.min(depth_norm)}, max: {np.max(depth_norm)}, mean: {np.mean(depth_norm)}"
-                                    )
-
-                                # Convert to 3D coordinates
-                                if depth is not None and not np.isnan(depth):
-                                    try:
-                                        # Check if camera model is available
-                                        if self.camera is None:
-                                            self.logger.error(
-                                                "Camera model is None, reinitializing..."
-                                            )
-                                            # Get dimensions from the current frame
-                                            height, width = frame.shape[:2]
-                                            try:
-                                                self.camera = (
-                                                    camera_model.PinholeCamera(
-                                                        image_size=(width, height)
-                                                    )
-                                                )
-                                                self.logger.info(
-                                                    f"Camera model reinitialized with dimensions {width}x{height}"
-                                                )
-                                            except Exception as camera_init_error:
-                                                self.logger.error(
-                                                    f"Failed to reinitialize camera model: {camera_init_error}"
-                                                )
-                                                detection["position_3d"] = None
-                                                continue
-
-                                        # Double-check camera model is still available (could be changed by another thread)
-                                        if self.camera is None:
-                                            self.logger.error(
-                                                "Camera model is still None after reinitialization attempt"
-                                            )
-                                            detection["position_3d"] = None
-                                            continue
-
-                                        # Now safely attempt to get 3D positions using calibrated depth
-                                        try:
-                                            world_coords = self.camera.pixel_to_3d(
-                                                center_x,
-                                                center_y,
-                                                depth,
-                                                normalized_depth=True,
-                                                depth_scale=5.0,  # Use more realistic scale for better real-world positioning
-                                            )
-                                            self.logger.info(
-                                                f"Calculated 3D position: {world_coords}"
-                                            )
-                                        except AttributeError as attr_err:
-                                            # This can happen if camera becomes None between the check and the call (race condition)
-                                            self.logger.error(
-                                                f"AttributeError accessing camera model: {attr_err}"
-                                            )
-                                            detection["position_3d"] = None
-                                            continue
-                                        except Exception as pixel_err:
-                                            self.logger.error(
-                                                f"Error in pixel_to_3d: {pixel_err}"
-                                            )
-                                            detection["position_3d"] = None
-                                            continue
-
-                                        # Check if world_coords is valid (not None)
-                                        if world_coords is not None:
-                                            try:
-                                                # Convert each coordinate to float explicitly with safe unpacking
-                                                if (
-                                                    isinstance(
-                                                        world_coords, (list, tuple)
-                                                    )
-                                                    and len(world_coords) >= 3
-                                                ):
-                                                    x, y, z = world_coords
-                                                    float_x = float(x)
-                                                    float_y = float(y)
-                                                    float_z = float(z)
-
-                                                    # Verify these are valid numbers
-                                                    if (
-                                                        not np.isnan(float_x)
-                                                        and not np.isnan(float_y)
-                                                        and not np.isnan(float_z)
-                                                    ):
-                                                        # Store as list of floats for JavaScript compatibility
-                                                        detection["position_3d"] = [
-                                                            float_x,
-                                                            float_y,
-                                                            float_z,
-                                                        ]
-                                                        self.logger.debug(
-                                                            f"3D position for {detection.get('class_name')}: {detection['position_3d']}"
-                                                        )
-                                                    else:
-                                                        self.logger.warning(
-                                                            f"NaN values in world coordinates: {world_coords}"
-                                                        )
-                                                        detection["position_3d"] = None
-                                                else:
-                                                    # Handle the case when world_coords is not iterable or has wrong length
-                                                    self.logger.warning(
-                                                        f"Invalid world_coords format: {type(world_coords)}, value: {world_coords}"
-                                                    )
-                                                    detection["position_3d"] = None
-                                            except (TypeError, ValueError) as e:
-                                                # Catch any unpacking errors
-                                                self.logger.error(
-                                                    f"Error unpacking world_coords: {e}, value: {world_coords}"
-                                                )
-                                                detection["position_3d"] = None
-                                        else:
-                                            self.logger.debug(
-                                                f"Invalid 3D coordinates calculated for detection at ({center_x}, {center_y})"
-                                            )
-                                            detection["position_3d"] = None
-                                    except Exception as coord_err:
-                                        self.logger.error(
-                                            f"Error calculating 3D coordinates: {coord_err}"
-                                        )
-                                        detection["position_3d"] = None
-                                else:
-                                    self.logger.debug(
-                                        f"No valid depth for detection at ({center_x}, {center_y})"
-                                    )
-                                    detection["position_3d"] = None
-                            except Exception as pos_error:
-                                self.logger.error(
-                                    f"Error calculating 3D position: {pos_error}"
-                                )
-                                detection["position_3d"] = None
-
-                        # Debug detection data
-                    self.logger.debug(f"Processing {len(detections)} detections")
-                    for i, d in enumerate(detections):
-                        self.logger.debug(
-                            f"Detection {i}: {d.get('class_name')}, bbox: {d.get('bbox')}, position_3d: {d.get('position_3d')}"
-                        )
+            # Let the eventlet/gevent hub run pending emit IO; a no-op sleep
+            # in threading mode
+            self.socketio.sleep(0)
 
-                    # Get 3D positions for visualization
-                    positions_3d = [d.get("position_3d", (0, 0, 0)) for d in detections]
+        self._flush_detections()
 
-                    # Draw visualizations
-                    try:
-                        # Draw bounding boxes and labels
-                        frame = self.vis.draw_detections(
-                            frame, detections, positions_3d
-                        )
-                        self.logger.debug("Visualizations drawn successfully")
+    def _finish_pending(self, pending):
+        """Collect an in-flight inference from the worker and post-process it"""
+        frame, ticket = pending
+        try:
+            detections, depth_map = self._inference.collect(ticket)
+            self._handle_results(frame, detections, depth_map)
+        except Exception as e:
+            self.logger.error(f"Error in processing thread: {e}")
 
-                        # Add depth visualization if enabled
-                        if self.vis.show_depth:
-                            frame = self.vis.add_depth_visualization(frame, depth_norm)
-                    except Exception as viz_error:
-                        self.logger.error(f"Visualization error: {viz_error}")
-                        import traceback
+    def _handle_results(self, frame, detections, depth_map):
+        """Project, visualize and publish the model results for a frame"""
+        # Update frame with visualizations
+        if self.vis is None:
+            self.logger.warning("Visualizer is None, reinitializing...")
+            try:
+                self.vis = visualizer.Visualizer()
+                self.logger.info("Visualizer reinitialized successfully")
+            except Exception as viz_reinit_error:
+                self.logger.error(
+                    f"Failed to reinitialize visualizer: {viz_reinit_error}"
+                )
 
-                        self.logger.error(traceback.format_exc())
+        if self.vis:
+            # Get 3D positions for detections
+            self._compute_positions(detections, depth_map)
+
+        # Debug detection data
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Processing %d detections", len(detections))
+            for i, d in enumerate(detections):
+                self.logger.debug(
+                    "Detection %d: %s, bbox: %s, position_3d: %s",
+                    i,
+                    d.get("class_name"),
+                    d.get("bbox"),
+                    d.get("position_3d"),
+                )
 
-                    # Update the frame buffer with the processed frame
-                    self.frame_buffer = frame
+        # Get 3D positions for visualization
+        positions_3d = [d.get("position_3d", (0, 0, 0)) for d in detections]
 
-                    # Prepare detection data for clients
-                    detection_data = []
-                    self.logger.debug(
-                        f"Processing {len(detections)} detections for emit"
-                    )
+        # Draw visualizations
+        try:
+            # The depth thumbnail is only seen on /stream, so skip it while
+            # nobody is watching
+            depth_overlay = None
+            if self.vis.show_depth and self._mjpeg_viewers:
+                depth_overlay = depth_map
+
+            # Bounding boxes, labels and depth; process_frames owns the
+            # frame, so compose into it in place
+            frame = self.vis.compose(frame, detections, positions_3d, depth_overlay)
+            self.logger.debug("Visualizations drawn successfully")
+        except Exception as viz_error:
+            self.logger.error(f"Visualization error: {viz_error}")
+            import traceback
+
+            self.logger.error(traceback.format_exc())
+
+        # Update the frame buffer with the processed frame
+        self.frame_buffer = frame
+        self._publish_frame(frame)
+
+        # Prepare detection data for clients
+        self.logger.debug("Processing %d detections for emit", len(detections))
+        payload = self._build_detection_payload(detections)
+
+        # Queue data for clients
+        if payload is not None:
+            self._queue_detections(payload)
+        else:
+            self.logger.debug("No valid detections to emit")
+
+    def _queue_detections(self, payload):
+        """
+        Queue a frame's detection payload, emitting the pending batch once it
+        is full or has waited long enough.
+
+        Batching cuts the number of Socket.IO packets at high frame rates; at
+        low frame rates the interval has already elapsed, so results are
+        emitted as soon as they arrive.
+        """
+        self._pending_results.append(payload)
+        if (
+            len(self._pending_results) >= DETECTION_BATCH_SIZE
+            or time.monotonic() - self._last_emit > DETECTION_BATCH_INTERVAL
+        ):
+            self._flush_detections()
+
+    def _flush_detections(self):
+        """Emit all pending detection payloads as a single batch"""
+        self._last_emit = time.monotonic()
+        if not self._pending_results:
+            return
+        batch, self._pending_results = self._pending_results, []
+        self.logger.debug("Emitting %d batched results to clients", len(batch))
+        self.socketio.emit(
+            "detection_results",
+            {"batch": batch, "timestamps": [p["timestamp"] for p in batch]},
+            to=VIEWERS_ROOM,
+        )
 
-                    for d in detections:
-                        try:
-                            # Ensure bbox is valid before including the detection
-                            bbox = d.get("bbox")
-                            if not bbox or len(bbox) != 4:
-                                self.logger.warning(
-                                    f"Detection missing valid bbox: {d.get('class_name')}"
-                                )
-                                continue
-
-                            # Ensure all bbox values are numeric
-                            try:
-                                bbox_values = [float(v) for v in bbox]
-                                # Ensure bbox values are within frame
-                                if any(v < 0 for v in bbox_values[:2]) or any(
-                                    v > 5000 for v in bbox_values[2:]
-                                ):
-                                    self.logger.warning(
-                                        f"Detection has out-of-bounds bbox: {bbox_values}"
-                                    )
-                                    continue
-                            except (ValueError, TypeError):
-                                self.logger.warning(
-                                    f"Non-numeric values in bbox: {bbox}"
-                                )
-                                continue
-
-                            # Basic required fields
-                            data = {
-                                "label": d.get("class_name", "unknown"),
-                                "confidence": float(d.get("confidence", 0.0)),
-                                "bbox": bbox_values,
-                                "position_3d": None,
-                            }
-
-                            # Add 3D position data if available
-                            if "position_3d" in d and d["position_3d"] is not None:
-                                pos = d["position_3d"]
-                                if isinstance(pos, (list, tuple)) and len(pos) >= 3:
-                                    # Convert all position values to float and validate each one
-                                    try:
-                                        pos_data = [float(v) for v in pos[:3]]
-
-                                        # Check for any invalid values
-                                        if any(np.isnan(v) for v in pos_data) or any(
-                                            np.isinf(v) for v in pos_data
-                                        ):
-                                            self.logger.warning(
-                                                f"NaN or Inf in position data: {pos_data}"
-                                            )
-                                            # Use None for invalid positions
-                                            data["position_3d"] = None
-                                        else:
-                                            # Accept all valid numeric positions
-                                            data["position_3d"] = pos_data
-                                            self.logger.info(
-                                                f"Valid 3D position for {data['label']}: {pos_data}"
-                                            )
-                                    except (ValueError, TypeError) as val_err:
-                                        self.logger.warning(
-                                            f"Error converting position values: {val_err}"
-                                        )
-                                        data["position_3d"] = None
-                                else:
-                                    self.logger.warning(
-                                        f"Invalid position format: {pos}"
-                                    )
-                                    data["position_3d"] = None
-                            else:
-                                # No position data available
-                                data["position_3d"] = None
-
-                            detection_data.append(data)
-
-                        except Exception as det_error:
-                            self.logger.error(
-                                f"Error processing detection for emit: {det_error}"
-                            )
-                            continue
+    def _build_detection_payload(self, detections):
+        """Pack detections into a binary payload for clients (see pack_detections)"""
+        return pack_detections(detections, self.logger)
+
+    def _compute_positions(self, detections, depth_map):
+        """
+        Attach a 3D position to each detection.
+
+        Box centers, bounds checks and depth lookups are computed for all
+        detections at once; only the projection itself runs per detection.
+        The raw depth map is never normalized as a whole, only the sampled
+        center depths are scaled to 0-1.
+        """
+        valid = []
+        for detection in detections:
+            bbox = detection.get("bbox")
+            if not bbox or len(bbox) != 4:
+                self.logger.warning(f"Invalid bbox: {bbox}")
+                continue
+            valid.append(detection)
+        if not valid:
+            return
 
-                    # Send data to clients with validation
-                    if detection_data:
-                        self.logger.debug(
-                            f"Emitting {len(detection_data)} detections to clients"
-                        )
+        try:
+            bboxes = np.asarray([d["bbox"] for d in valid], dtype=np.float32)
+        except (TypeError, ValueError) as e:
+            self.logger.error(f"Error calculating 3D position: {e}")
+            for detection in valid:
+                detection["position_3d"] = None
+            return
+
+        # Calculate center points and check they fall within the depth map
+        height, width = depth_map.shape[:2]
+        centers = ((bboxes[:, 0:2] + bboxes[:, 2:4]) * 0.5).astype(np.int32)
+        in_bounds = (
+            (centers[:, 0] >= 0)
+            & (centers[:, 1] >= 0)
+            & (centers[:, 0] < width)
+            & (centers[:, 1] < height)
+        )
 
-                        # Check the first few detections for position_3d data
-                        has_positions = any(
-                            d.get("position_3d") is not None for d in detection_data[:5]
-                        )
-                        if not has_positions:
-                            self.logger.warning(
-                                "No valid position_3d data in detections"
-                            )
+        # Sample depth at every in-bounds center with a single gather
+        depths = np.full(len(valid), np.nan, dtype=np.float32)
+        depths[in_bounds] = depth_map[centers[in_bounds, 1], centers[in_bounds, 0]]
 
-                        self.socketio.emit(
-                            "detection_results",
-                            {"detections": detection_data, "timestamp": time.time()},
-                        )
-                    else:
-                        self.logger.debug("No valid detections to emit")
+        # Min-max normalize just the samples, matching cv2.normalize over the
+        # full map; a flat map normalizes to zero
+        depth_min, depth_max = cv2.minMaxLoc(depth_map)[:2]
+        depth_range = depth_max - depth_min
+        if depth_range > 0:
+            depths = (depths - depth_min) / depth_range
+        else:
+            depths[in_bounds] = 0.0
 
-                except Exception as e:
-                    self.logger.error(f"Error in processing thread: {e}")
+        # Check camera model is available
+        if self.camera is None:
+            self.logger.error("Camera model is None, reinitializing...")
+            try:
+                self.camera = camera_model.PinholeCamera(image_size=(width, height))
+                self.logger.info(
+                    f"Camera model reinitialized with dimensions {width}x{height}"
+                )
+            except Exception as camera_init_error:
+                self.logger.error(
+                    f"Failed to reinitialize camera model: {camera_init_error}"
+                )
+                for detection in valid:
+                    detection["position_3d"] = None
+                return
+
+        # Keep a local reference in case another thread swaps the camera model
+        camera = self.camera
+
+        # Log depth map stats for debugging; the mean is a full-map reduction, so
+        # only computed when the record will actually be emitted
+        debug = self.logger.isEnabledFor(logging.DEBUG)
+        if debug:
+            self.logger.debug(
+                "Depth map stats - min: %s, max: %s, mean: %s",
+                depth_min,
+                depth_max,
+                np.mean(depth_map),
+            )
 
-            # Sleep to reduce CPU usage
-            time.sleep(0.01)
+        # Project all centers in one call; invalid depths come back as NaN rows
+        try:
+            points = camera.pixels_to_3d(
+                centers[:, 0],
+                centers[:, 1],
+                depths,
+                normalized_depth=True,
+                depth_scale=5.0,  # Use more realistic scale for better real-world positioning
+            )
+        except Exception as pixel_err:
+            self.logger.error(f"Error in pixels_to_3d: {pixel_err}")
+            for detection in valid:
+                detection["position_3d"] = None
+            return
+
+        for detection, (center_x, center_y), depth, inside, world_coords in zip(
+            valid,
+            centers.tolist(),
+            depths.tolist(),
+            in_bounds.tolist(),
+            points.tolist(),
+        ):
+            detection["position_3d"] = None
+
+            if not inside:
+                self.logger.warning(
+                    "Center point out of bounds: (%d, %d)", center_x, center_y
+                )
+                continue
+
+            if debug:
+                self.logger.debug(
+                    "Depth at (%d, %d) for %s: %s",
+                    center_x,
+                    center_y,
+                    detection.get("class_name"),
+                    depth,
+                )
+
+            # NaN is the only value not equal to itself
+            if depth != depth:
+                self.logger.debug(
+                    "No valid depth for detection at (%d, %d)", center_x, center_y
+                )
+                continue
+
+            # NaN rows mark depths pixels_to_3d rejected
+            if world_coords[2] != world_coords[2]:
+                self.logger.debug(
+                    "Invalid 3D coordinates calculated for detection at (%d, %d)",
+                    center_x,
+                    center_y,
+                )
+                continue
+
+            # pixels_to_3d has already validated these as finite; tolist() gives
+            # plain floats, stored as a list for JavaScript compatibility
+            detection["position_3d"] = world_coords
+            if debug:
+                self.logger.debug(
+                    "3D position for %s: %s",
+                    detection.get("class_name"),
+                    detection["position_3d"],
+                )
+
+    def _run_models(self, frame):
+        """
+        Run detection and depth estimation on a frame in this process.
+
+        Returns:
+            detections: List of detection dictionaries
+            depth_map: Raw (unnormalized) depth map
+        """
+        detections = self.detector.detect(frame)
+        depth_map, _ = self.depth_estimator.estimate_depth(frame, normalize=False)
+        return detections, depth_map
+
+    def _publish_frame(self, frame):
+        """Encode a processed frame once and wake MJPEG viewers waiting for it"""
+        if not self._mjpeg_viewers:
+            # Nobody is watching /stream; drop the stale JPEG so the next viewer
+            # starts from a fresh frame
+            self._frame_jpeg = None
+            return
+
+        ok, jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 80])
+        if not ok:
+            self.logger.warning("Failed to encode processed frame as JPEG")
+            return
+
+        # Build the whole multipart part in one allocation straight from the
+        # encoder's buffer, instead of concatenating per viewer
+        part = b"".join((_MJPEG_PART_HEADER, jpeg.data, b"\r\n"))
+        with self._new_frame_cond:
+            self._frame_jpeg = part
+            self._frame_seq += 1
+            self._new_frame_cond.notify_all()
 
     def start_processing(self):
-        """Start the frame processing thread"""
+        """Start the frame processing task"""
         if not self.is_processing:
             self.is_processing = True
-            self.processing_thread = threading.Thread(target=self.process_frames)
-            self.processing_thread.daemon = True
-            self.processing_thread.start()
+            # A daemon thread in threading mode, a green thread under
+            # eventlet/gevent so emits go through the server's hub
+            self.processing_thread = self.socketio.start_background_task(
+                self.process_frames
+            )
 
     def safe_stop_processing(self):
         """Safely stop processing without attempting to join from the same thread"""
@@ -790,42 +1072,65 @@ class WebServer:
         self.is_processing = False
         # Don't attempt to join threads - just mark it for stopping
 
-    def stop_processing(self):
-        """Stop the frame processing thread"""
+    def stop_processing(self, timeout=1.0):
+        """
+        Stop the frame processing task and wait for it to exit.
+
+        Args:
+            timeout: Seconds to wait for the processing loop to return
+        """
         self.logger.info("Stopping processing thread")
         self.is_processing = False
 
-        # Only join the thread if we're not in the same thread
-        if (
-            self.processing_thread
-            and self.processing_thread != threading.current_thread()
-        ):
-            try:
-                self.processing_thread.join(timeout=1.0)
-                self.processing_thread = None
-                self.logger.info("Processing thread stopped successfully")
-            except RuntimeError as e:
-                self.logger.error(f"Error joining processing thread: {e}")
-        else:
+        ident = self._processing_ident
+        if ident is None or ident == threading.get_ident():
             self.logger.info(
                 "Processing thread marked for stopping (same thread or None)"
             )
+            return
+
+        # start_background_task returns a green thread under eventlet/gevent,
+        # whose wait takes no timeout, so poll the loop's ident instead;
+        # socketio.sleep yields to the hub in those modes
+        deadline = time.monotonic() + timeout
+        while self._processing_ident is not None and time.monotonic() < deadline:
+            self.socketio.sleep(0.05)
+        if self._processing_ident is None:
+            self.processing_thread = None
+            self.logger.info("Processing thread stopped successfully")
+        else:
+            self.logger.warning(
+                "Processing thread did not stop within %.1f seconds", timeout
+            )
+
+    def start(self, debug=False):
+        """
+        Start the web server.
 
-    def start(self):
-        """Start the web server"""
+        Args:
+            debug: Run Flask in debug mode, with the reloader and debugger
+        """
         self.logger.info(f"Starting server on {self.host}:{self.port}")
+        num_threads = _limit_inference_threads()
+        self.logger.info(f"Limiting inference to {num_threads} threads")
         self.socketio.run(
             self.app,
             host=self.host,
             port=self.port,
-            debug=True,
+            debug=debug,
             allow_unsafe_werkzeug=True,
         )
 
     def shutdown(self):
         """Shutdown the server and cleanup resources"""
+        # Wake and end any open /stream responses
+        with self._new_frame_cond:
+            self._shutdown = True
+            self._new_frame_cond.notify_all()
         self.stop_processing()
-        # Additional cleanup can be added here
+        if self._inference is not None:
+            self._inference.close()
+            self._inference = None
 
 
 def main():
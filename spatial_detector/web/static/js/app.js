@@ -54,7 +54,8 @@ class SpatialDetectorApp {
         this.serverInfo = {
             isMac: false,
             detectorReady: false,
-            depthReady: false
+            depthReady: false,
+            socketSerializer: 'json'
         };
     }
 
@@ -73,12 +74,12 @@ class SpatialDetectorApp {
             this.bboxRenderer = new BoundingBoxRenderer(videoContainer);
         }
 
+        // Fetch initial server status (tells us which Socket.IO serializer to use)
+        await this.fetchServerStatus();
+
         // Connect to server
         await this.connectToServer();
 
-        // Fetch initial server status
-        await this.fetchServerStatus();
-
         // Setup connection event handlers
         this.setupConnectionHandlers();
 
@@ -101,6 +102,7 @@ class SpatialDetectorApp {
      */
     async connectToServer() {
         try {
+            await this.connection.useSerializer(this.serverInfo.socketSerializer);
             await this.connection.connect();
             this.ui.updateConnectionStatus(true, 'Connected');
             this.ui.showStatus('success', 'Connected to server');
@@ -150,11 +152,21 @@ class SpatialDetectorApp {
      * Handle detection results
      */
     handleDetectionResults(data) {
+        // The server coalesces results from several frames into one message;
+        // count every frame but only render the newest
+        if (Array.isArray(data.batch)) {
+            if (data.batch.length === 0) return;
+            this.performance.frameCount += data.batch.length - 1;
+            data = data.batch[data.batch.length - 1];
+        }
+
         // Update FPS
         this.updateFPS();
 
         // Process detections
-        const processed = this.detectionProcessor.processResults(data.detections || []);
+        const processed = this.detectionProcessor.processResults(
+            this.detectionProcessor.unpackResults(data)
+        );
 
         // Update stream view if present
         if (data.image) {
@@ -227,7 +239,8 @@ class SpatialDetectorApp {
             this.serverInfo = {
                 isMac: data.is_mac || false,
                 detectorReady: data.detector_ready || false,
-                depthReady: data.depth_ready || false
+                depthReady: data.depth_ready || false,
+                socketSerializer: data.socket_serializer || 'json'
             };
 
             // Update UI based on capabilities
@@ -12,6 +12,9 @@ class CameraManager {
         this.stream = null;
         this.availableCameras = [];
         this.frameCapturingInterval = null;
+        // Delay between captured frames; raised when the server asks us to throttle
+        this.defaultFrameDelay = 50; // 20 FPS
+        this.frameDelay = this.defaultFrameDelay;
 
         this.initEventListeners();
         this.enumerateDevices();
@@ -216,11 +219,20 @@ class CameraManager {
      */
     startFrameCapture() {
         if (this.frameCapturingInterval) {
-            clearInterval(this.frameCapturingInterval);
+            clearTimeout(this.frameCapturingInterval);
         }
+        this.frameDelay = this.defaultFrameDelay;
+
+        // Self-scheduling so the delay can change with server back-pressure
+        const scheduleNext = () => {
+            this.frameCapturingInterval = setTimeout(captureFrame, this.frameDelay);
+        };
 
         const captureFrame = () => {
-            if (!this.stream || !socket || !socket.connected) return;
+            if (!this.stream || !socket || !socket.connected) {
+                scheduleNext();
+                return;
+            }
 
             // Create a canvas to get frame data
             const canvas = document.createElement('canvas');
@@ -233,15 +245,38 @@ class CameraManager {
             // Draw video frame to canvas
             context.drawImage(this.videoElement, 0, 0, canvas.width, canvas.height);
 
-            // Get base64 encoded image
-            const imageData = canvas.toDataURL('image/jpeg', 0.7);
+            // Send the JPEG bytes as a binary attachment; avoids base64
+            // inflating the payload by a third and decoding it on the server
+            canvas.toBlob((blob) => {
+                if (!blob) return;
+                blob.arrayBuffer().then((buffer) => {
+                    socket.emit('frame', { image: buffer }, (response) => {
+                        this.handleFrameAck(response);
+                    });
+                });
+            }, 'image/jpeg', 0.7);
 
-            // Send to server
-            socket.emit('frame', { image: imageData });
+            scheduleNext();
         };
 
         // Capture frames at regular intervals
-        this.frameCapturingInterval = setInterval(captureFrame, 50); // 20 FPS
+        scheduleNext();
+    }
+
+    /**
+     * Adjust the capture rate from the server's frame acknowledgement
+     * @param {Object} response - Ack from the 'frame' event
+     */
+    handleFrameAck(response) {
+        if (!response) return;
+
+        if (response.status === 'throttle' && response.target_fps > 0) {
+            // Inference is falling behind; only the newest frame is used anyway
+            this.frameDelay = Math.max(this.frameDelay, 1000 / response.target_fps);
+        } else if (response.status === 'received') {
+            // Ease back towards the default rate once the server keeps up
+            this.frameDelay = Math.max(this.defaultFrameDelay, this.frameDelay * 0.9);
+        }
     }
 
     /**
@@ -249,7 +284,7 @@ class CameraManager {
      */
     stopFrameCapture() {
         if (this.frameCapturingInterval) {
-            clearInterval(this.frameCapturingInterval);
+            clearTimeout(this.frameCapturingInterval);
             this.frameCapturingInterval = null;
         }
     }
@@ -11,6 +11,7 @@ class ConnectionManager extends EventTarget {
     constructor(url = null) {
         super();
         this.url = url || window.location.origin;
+        this.parser = null; // Custom Socket.IO parser (e.g. msgpack), null = default JSON
         this.socket = null;
         this.connected = false;
         this.reconnectAttempts = 0;
@@ -37,11 +38,15 @@ class ConnectionManager extends EventTarget {
             console.log('Connecting to server...');
 
             // Create socket connection
-            this.socket = io(this.url, {
+            const options = {
                 reconnection: false, // We'll handle reconnection manually
                 transports: ['websocket'],
                 upgrade: false
-            });
+            };
+            if (this.parser) {
+                options.parser = this.parser;
+            }
+            this.socket = io(this.url, options);
 
             // Setup event handlers
             this.setupSocketHandlers();
@@ -56,6 +61,24 @@ class ConnectionManager extends EventTarget {
         }
     }
 
+    /**
+     * Use the packet serializer advertised by the server
+     * @param {string} serializer - Serializer name from /api/status
+     */
+    async useSerializer(serializer) {
+        this.parser = null;
+        if (serializer !== 'msgpack') {
+            return;
+        }
+        // The parser is served with the app, so offline LAN or hotspot clients
+        // can use it too; fall back to the default JSON parser if it fails
+        try {
+            this.parser = await import('../vendor/socket.io-msgpack-parser.js');
+        } catch (error) {
+            console.error('Could not load the msgpack parser, falling back to JSON.', error);
+        }
+    }
+
     /**
      * Setup socket event handlers
      */
@@ -204,7 +227,7 @@ class ConnectionManager extends EventTarget {
 
     /**
      * Send frame with queue management
-     * @param {string} frameData - Base64 encoded frame
+     * @param {string|ArrayBuffer} frameData - Base64 data URL or JPEG bytes
      */
     sendFrame(frameData) {
         if (!this.connected) {
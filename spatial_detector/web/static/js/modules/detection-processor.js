@@ -7,6 +7,18 @@
  * - Detection tracking and deduplication
  * - Confidence-based filtering
  */
+
+// Byte layout of one record in the binary detection_results payload. Mirrors
+// DETECTION_RECORD_DTYPE in spatial_detector/web/payload.py; change both
+// together (tests/test_detection_payload.py checks that they agree).
+const DETECTION_RECORD = {
+    BYTES: 36,
+    CONFIDENCE: 0, // float32
+    BBOX: 4, // float32[4]
+    POSITION_3D: 20, // float32[3], NaN when unknown
+    CLASS_ID: 32 // uint16, followed by 2 bytes of padding
+};
+
 class DetectionProcessor {
     constructor(options = {}) {
         this.minConfidence = options.minConfidence || 0.5;
@@ -28,6 +40,45 @@ class DetectionProcessor {
         };
     }
 
+    /**
+     * Unpack a binary detection_results payload into detection objects
+     *
+     * Records follow DETECTION_RECORD: float32 confidence, float32 bbox[4],
+     * float32 position_3d[3] (NaN when unknown), uint16 class_id, uint16 padding.
+     * @param {Object} data - Payload with records, labels and n
+     * @returns {Array} Detection objects
+     */
+    unpackResults(data) {
+        if (!data || !data.n || !data.records) {
+            return [];
+        }
+
+        // Parsers may hand over a typed-array view rather than an ArrayBuffer;
+        // copy it out so the float view starts on an aligned offset
+        let buffer = data.records;
+        if (ArrayBuffer.isView(buffer)) {
+            buffer = buffer.buffer.slice(buffer.byteOffset, buffer.byteOffset + buffer.byteLength);
+        }
+
+        const floats = new Float32Array(buffer, 0, data.n * DETECTION_RECORD.BYTES / 4);
+        const words = new Uint16Array(buffer, 0, data.n * DETECTION_RECORD.BYTES / 2);
+        const detections = new Array(data.n);
+        for (let i = 0; i < data.n; i++) {
+            const f = i * DETECTION_RECORD.BYTES / 4;
+            const bbox = f + DETECTION_RECORD.BBOX / 4;
+            const pos = f + DETECTION_RECORD.POSITION_3D / 4;
+            const position = Array.from(floats.subarray(pos, pos + 3));
+            detections[i] = {
+                label: data.labels[i],
+                class_id: words[(i * DETECTION_RECORD.BYTES + DETECTION_RECORD.CLASS_ID) / 2],
+                confidence: floats[f + DETECTION_RECORD.CONFIDENCE / 4],
+                bbox: Array.from(floats.subarray(bbox, bbox + 4)),
+                position_3d: position.every(Number.isFinite) ? position : null
+            };
+        }
+        return detections;
+    }
+
     /**
      * Process a batch of detection results
      * @param {Array} detections - Raw detection results
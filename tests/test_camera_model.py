@@ -0,0 +1,51 @@
+"""Tests for the pinhole camera projection"""
+
+import numpy as np
+import pytest
+
+from spatial_detector.projection.camera_model import PinholeCamera
+
+# Pixels across the frame, with valid, clamped and invalid depths
+XS = [0, 640, 1279, 100.5, 900, 320, 10, 1000, 500]
+YS = [0, 360, 719, 50.25, 600, 200, 700, 20, 400]
+NORMALIZED_DEPTHS = [0.5, 1.0, 0.01, 1.7, 0.0, -0.2, np.nan, np.inf, -np.inf]
+METRIC_DEPTHS = [2.5, 0.3, 999.0, 4000.0, 0.0, -1.0, np.nan, np.inf, 12.0]
+
+
+def _row_wise(camera, depths, **kwargs):
+    """Project with pixel_to_3d one pixel at a time, None becoming NaN"""
+    rows = []
+    for x, y, depth in zip(XS, YS, depths):
+        point = camera.pixel_to_3d(x, y, depth, **kwargs)
+        rows.append([np.nan] * 3 if point is None else point)
+    return np.array(rows)
+
+
+@pytest.fixture
+def camera():
+    return PinholeCamera(
+        focal_length=(900, 850), principal_point=(630, 370), image_size=(1280, 720)
+    )
+
+
+def test_normalized_depth_matches_pixel_to_3d(camera):
+    expected = _row_wise(camera, NORMALIZED_DEPTHS, depth_scale=4.0)
+    points = camera.pixels_to_3d(XS, YS, NORMALIZED_DEPTHS, depth_scale=4.0)
+
+    assert points.shape == (len(XS), 3)
+    np.testing.assert_allclose(points, expected, rtol=1e-12, equal_nan=True)
+
+
+def test_metric_depth_matches_pixel_to_3d(camera):
+    expected = _row_wise(camera, METRIC_DEPTHS, normalized_depth=False)
+    points = camera.pixels_to_3d(XS, YS, METRIC_DEPTHS, normalized_depth=False)
+
+    np.testing.assert_allclose(points, expected, rtol=1e-12, equal_nan=True)
+
+
+def test_invalid_depths_become_nan_rows(camera):
+    points = camera.pixels_to_3d(XS, YS, NORMALIZED_DEPTHS)
+
+    invalid = np.array([not 0 < d < np.inf for d in NORMALIZED_DEPTHS])
+    assert np.isnan(points[invalid]).all()
+    assert np.isfinite(points[~invalid]).all()
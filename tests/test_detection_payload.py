@@ -0,0 +1,117 @@
+"""Tests for the binary detection payload and its JavaScript mirror"""
+
+import logging
+import re
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from spatial_detector.web.payload import DETECTION_RECORD_DTYPE, pack_detections
+
+DETECTION_PROCESSOR_JS = (
+    Path(__file__).resolve().parents[1]
+    / "spatial_detector"
+    / "web"
+    / "static"
+    / "js"
+    / "modules"
+    / "detection-processor.js"
+)
+
+LOGGER = logging.getLogger(__name__)
+
+DETECTIONS = [
+    {
+        "bbox": [10, 20, 110, 220],
+        "class_id": 0,
+        "class_name": "person",
+        "confidence": 0.9,
+        "position_3d": [0.5, -0.25, 2.0],
+    },
+    {
+        "bbox": [300.5, 40, 360, 90.25],
+        "class_id": 56,
+        "class_name": "chair",
+        "confidence": 0.55,
+    },
+]
+
+
+def _js_layout():
+    """Parse the DETECTION_RECORD constants out of detection-processor.js"""
+    source = DETECTION_PROCESSOR_JS.read_text()
+    block = re.search(r"const DETECTION_RECORD = \{(.*?)\};", source, re.S)
+    assert block, "DETECTION_RECORD not found in detection-processor.js"
+    return {
+        key: int(value) for key, value in re.findall(r"(\w+):\s*(\d+)", block.group(1))
+    }
+
+
+def test_record_layout():
+    assert DETECTION_RECORD_DTYPE.itemsize == 36
+    offsets = {
+        name: offset for name, (_, offset) in DETECTION_RECORD_DTYPE.fields.items()
+    }
+    assert offsets == {
+        "confidence": 0,
+        "bbox": 4,
+        "position_3d": 20,
+        "class_id": 32,
+        "_pad": 34,
+    }
+
+
+def test_js_mirrors_record_layout():
+    fields = DETECTION_RECORD_DTYPE.fields
+    assert _js_layout() == {
+        "BYTES": DETECTION_RECORD_DTYPE.itemsize,
+        "CONFIDENCE": fields["confidence"][1],
+        "BBOX": fields["bbox"][1],
+        "POSITION_3D": fields["position_3d"][1],
+        "CLASS_ID": fields["class_id"][1],
+    }
+
+
+def test_pack_detections():
+    payload = pack_detections(DETECTIONS, LOGGER)
+
+    assert payload["n"] == 2
+    assert payload["labels"] == ["person", "chair"]
+    assert len(payload["records"]) == 2 * 36
+
+    records = np.frombuffer(payload["records"], dtype=DETECTION_RECORD_DTYPE)
+    np.testing.assert_allclose(records["confidence"], [0.9, 0.55], rtol=1e-6)
+    np.testing.assert_array_equal(
+        records["bbox"], [[10, 20, 110, 220], [300.5, 40, 360, 90.25]]
+    )
+    np.testing.assert_array_equal(records["class_id"], [0, 56])
+    np.testing.assert_array_equal(records["position_3d"][0], [0.5, -0.25, 2.0])
+    # Unknown positions travel as NaN
+    assert np.isnan(records["position_3d"][1]).all()
+
+
+def test_pack_detections_reads_raw_offsets():
+    payload = pack_detections(DETECTIONS[:1], LOGGER)
+    raw = payload["records"]
+
+    assert np.frombuffer(raw, "<f4", count=1, offset=0)[0] == np.float32(0.9)
+    np.testing.assert_array_equal(
+        np.frombuffer(raw, "<f4", count=4, offset=4), [10, 20, 110, 220]
+    )
+    np.testing.assert_array_equal(
+        np.frombuffer(raw, "<f4", count=3, offset=20), [0.5, -0.25, 2.0]
+    )
+    assert np.frombuffer(raw, "<u2", count=1, offset=32)[0] == 0
+
+
+@pytest.mark.parametrize(
+    "detections",
+    [
+        [],
+        [{"bbox": [1, 2, 3], "class_name": "short"}],
+        [{"bbox": [-5, 0, 10, 10], "class_name": "outside"}],
+    ],
+)
+def test_pack_detections_without_valid_boxes(detections):
+    assert pack_detections(detections, LOGGER) is None
@@ -0,0 +1,72 @@
+"""Tests for the MiDaS GPU preprocessing sizes"""
+
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from spatial_detector.depth.gpu_preprocess import (  # noqa: E402
+    MIDAS_PREPROCESS,
+    midas_input_size,
+)
+
+# Common camera frames, odd sizes and extreme aspect ratios, as (height, width)
+FRAME_SIZES = [
+    (480, 640),
+    (720, 1280),
+    (1080, 1920),
+    (640, 480),
+    (240, 320),
+    (383, 383),
+    (300, 1000),
+    (1000, 300),
+    (50, 50),
+]
+
+HUB_TRANSFORMS = {
+    "MiDaS_small": "small_transform",
+    "DPT_Large": "dpt_transform",
+    "DPT_Hybrid": "dpt_transform",
+}
+
+
+@pytest.fixture(scope="module")
+def hub_transforms():
+    """The MiDaS transforms from torch.hub, which needs network access"""
+    try:
+        return torch.hub.load("intel-isl/MiDaS", "transforms")
+    except Exception as e:
+        pytest.skip(f"MiDaS hub transforms unavailable: {e}")
+
+
+@pytest.mark.parametrize(
+    ("model_type", "frame_size", "expected"),
+    [
+        ("MiDaS_small", (480, 640), (192, 256)),
+        # 144 / 32 = 4.5 rounds half to even, like np.round in MiDaS
+        ("MiDaS_small", (720, 1280), (128, 256)),
+        ("DPT_Large", (480, 640), (384, 512)),
+        ("DPT_Large", (720, 1280), (384, 672)),
+    ],
+)
+def test_known_sizes(model_type, frame_size, expected):
+    params = MIDAS_PREPROCESS[model_type]
+    size = midas_input_size(*frame_size, params["target"], params["resize_method"])
+    assert size == expected
+
+
+@pytest.mark.parametrize("model_type", sorted(MIDAS_PREPROCESS))
+@pytest.mark.parametrize("frame_size", FRAME_SIZES)
+def test_matches_hub_transform(hub_transforms, model_type, frame_size):
+    transform = getattr(hub_transforms, HUB_TRANSFORMS[model_type])
+    frame = np.zeros((*frame_size, 3), dtype=np.uint8)
+    expected = tuple(transform(frame).shape[2:])
+
+    params = MIDAS_PREPROCESS[model_type]
+    size = midas_input_size(*frame_size, params["target"], params["resize_method"])
+    assert size == expected
+
+
+def test_unknown_resize_method():
+    with pytest.raises(ValueError):
+        midas_input_size(480, 640, 256, "stretch")
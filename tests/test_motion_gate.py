@@ -0,0 +1,63 @@
+"""Tests for the webcam app's motion gate"""
+
+import numpy as np
+import pytest
+
+pytest.importorskip("torch")
+
+from spatial_detector.cli.webcam_app import _MotionGate
+
+THRESHOLD = 8.0
+
+
+def _frame_with_block(x, y, size=160):
+    """Dark 640x480 frame with a bright square at (x, y)"""
+    frame = np.full((480, 640, 3), 30, dtype=np.uint8)
+    frame[y : y + size, x : x + size] = 220
+    return frame
+
+
+def test_first_frame_is_not_static():
+    gate = _MotionGate(THRESHOLD)
+    assert not gate.is_static(_frame_with_block(40, 40))
+
+
+def test_static_frames_keep_the_gate_closed():
+    gate = _MotionGate(THRESHOLD)
+    frame = _frame_with_block(40, 40)
+    gate.is_static(frame)
+
+    # Sensor noise well below the threshold
+    rng = np.random.default_rng(0)
+    for _ in range(5):
+        noise = rng.integers(-3, 4, size=frame.shape)
+        noisy = np.clip(frame.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+        assert gate.is_static(noisy)
+
+
+def test_moved_block_opens_the_gate():
+    gate = _MotionGate(THRESHOLD)
+    gate.is_static(_frame_with_block(40, 40))
+
+    moved = _frame_with_block(400, 260)
+    assert not gate.is_static(moved)
+    # The moved frame is the new reference
+    assert gate.is_static(moved)
+
+
+def test_static_frames_do_not_replace_the_reference():
+    gate = _MotionGate(THRESHOLD)
+    gate.is_static(_frame_with_block(40, 40))
+
+    # Each step is small, but the drift from the reference adds up
+    results = [
+        gate.is_static(_frame_with_block(40 + step, 40)) for step in (8, 16, 120)
+    ]
+    assert results == [True, True, False]
+
+
+def test_zero_threshold_disables_the_gate():
+    gate = _MotionGate(0)
+    frame = _frame_with_block(40, 40)
+    assert not gate.is_static(frame)
+    assert not gate.is_static(frame)